@@ -0,0 +1,77 @@
+"""
+Run to measure scraping throughput against a local fake of Google Maps.
+
+Usage: python benchmark_scraping.py [miles] [latency] [workers ...] [--follow-pages]
+    miles : synthetic highway length, 20 by default
+    latency : seconds per simulated request, 0.05 by default
+    workers : worker counts to compare, 1 4 16 by default
+"""
+#!/usr/bin/env python3
+import os
+import sys
+import tempfile
+import time
+from library.fake_google_maps import FakeGoogleMaps
+from scraping_script import scrape_and_save_to_files
+
+def benchmark(miles=20, latency=0.05, workers=1, follow_pages=False, **fake_options):
+    """
+    Scrapes a synthetic highway once with scraping_script.scrape_and_save_to_files, in a
+    temporary folder so no data files are overwritten.
+
+    Parameters:
+    * miles (float) : synthetic highway length
+    * latency (float) : seconds per simulated request
+    * workers (int) : highway points searched at once
+    * follow_pages (bool) : read every page of place results
+    * fake_options : passed on to FakeGoogleMaps (error_rate, queries_per_second, ...)
+
+    Returns:
+        Dictionary {workers, seconds, requests, requests_per_second, requests_per_mile,
+        hotels, errors, rate_limited, calls : {endpoint : count}}
+    """
+    fake = FakeGoogleMaps(length_miles=miles, latency=latency, **fake_options)
+    waypoints = fake.waypoints()
+    directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        try:
+            os.makedirs("hotel_data")
+            os.makedirs("snapped_highways")
+            start = time.perf_counter()
+            scrape_and_save_to_files(waypoints, "benchmark", verbose=False, workers=workers,
+                                     follow_pages=follow_pages, client=fake)
+            seconds = time.perf_counter() - start
+            with open("hotel_data/benchmark_hotels.txt", "r", encoding="utf-8") as file:
+                hotels = sum(1 for _ in file) - 1
+        finally:
+            os.chdir(directory)
+    requests = fake.total_calls()
+    return {
+        "workers": workers,
+        "seconds": seconds,
+        "requests": requests,
+        "requests_per_second": requests / seconds,
+        "requests_per_mile": requests / fake.road_miles(),
+        "hotels": hotels,
+        "errors": fake.errors,
+        "rate_limited": fake.rate_limited,
+        "calls": dict(fake.calls),
+    }
+
+if __name__ == "__main__":
+    follow_pages = "--follow-pages" in sys.argv
+    arguments = [argument for argument in sys.argv if argument != "--follow-pages"]
+
+    miles = float(arguments[1]) if len(arguments) >= 2 else 20
+    latency = float(arguments[2]) if len(arguments) >= 3 else 0.05
+    worker_counts = [int(argument) for argument in arguments[3:]] or [1, 4, 16]
+
+    print(f"{miles:g} mile highway, {latency:g} s per request")
+    print(f"{'workers':>8}{'seconds':>10}{'requests':>10}{'req/s':>9}{'req/mile':>10}{'hotels':>8}  calls")
+    for workers in worker_counts:
+        result = benchmark(miles, latency, workers, follow_pages)
+        calls = ", ".join(f"{endpoint} {count}" for endpoint, count in result["calls"].items())
+        print(f"{workers:>8}{result['seconds']:>10.2f}{result['requests']:>10}"
+              f"{result['requests_per_second']:>9.1f}{result['requests_per_mile']:>10.2f}"
+              f"{result['hotels']:>8}  {calls}")
@@ -6,29 +6,36 @@ Last Updated 8.7.2024
 Run either in the command line or by clicking run on file.
 
 If in command line, include the following:
-python clustering_script.py [snapped path] [hotel data] [name]
+python clustering_script.py [snapped path] [hotel data] [name] [--no-plots]
 **Example command line test:
 python clustering_script.py ./snapped_highways/test_input_path.txt ./hotel_data/test_input_hotels.txt test_input
 
 If hitting run on file, ensure the correct paths for lines 41-43.
 
 Tunable hyper-parameters are included on lines 47-56. Various visualizations are avaiable depending on test to run
+--no-plots runs every clustering without drawing anything, for batch jobs.
 """
 
 import sys
 import numpy as np
 from scipy.interpolate import CubicSpline
-from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
 import matplotlib.pyplot as plt
 from library.centroid_init import create_init_vectors, arc_length_div_init
 
 import scraping_script
-from library import cubic_spline, scrape_google_maps, visualize_clusters
+from library import beta_sweep, columnar, cubic_spline, scrape_google_maps, streaming, visualize_clusters
+from library.disk_cache import DiskCache
+from library.kmeans_cache import KMeansCache
 
 if __name__ == "__main__":
     import os
 
+    ### Plots are drawn after all clustering is done, unless --no-plots is passed
+    plots = "--no-plots" not in sys.argv
+    if not plots:
+        sys.argv.remove("--no-plots")
+
     if len(sys.argv) == 4:
         sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
         snapped_path = sys.argv[1]
@@ -50,45 +57,78 @@ if __name__ == "__main__":
     ### Beta method ("scaling", "adding", "bool_value")
     beta_method_list = ["scaling", "adding", "bool_value"]
 
+    ### Processes computing signed distance and beta sweeps (None uses every core)
+    workers = 1
+
+    ### Warm start each beta of the sweeps from the previous beta's centers
+    continuation = False
+
+    ### Refine betas only where the score changes instead of the fixed 0.05 grid
+    adaptive = False
+
     ### Beta matrix
     beta_array = ((0.5, 1.0),
                    (1.5, 2.0),
                    (3.0, 5.0))
 
+    ### Stream hotels from disk with MiniBatchKMeans instead of holding them in memory,
+    ### for hotel sets too large to load. Labels are written to results/{name}_streaming
+    stream_from_disk = False
+
 
     ######################################
     ### Retrieving Data ###
     ######################################
 
-    hotel_vectors_r3 = cubic_spline.retrieve_hotel_data(hotels_path)
-    true_path = scraping_script.read_data(snapped_path)
+    ### Paths may be text files or binary datasets made by library/columnar.py
+    if os.path.isdir(snapped_path):
+        true_path = columnar.load_path(snapped_path)
+    else:
+        true_path = scraping_script.read_data_array(snapped_path)
 
-    scaled_vectors_r3 = StandardScaler().fit(hotel_vectors_r3).transform(hotel_vectors_r3)
+    hw_cubic_spline, hw_cubic_spline_scaled = cubic_spline.create_cubic_splines(true_path)
 
+    if stream_from_disk:
+        stream = streaming.StreamingDataset(hotels_path, hw_cubic_spline, f"results/{name}_streaming")
+        fit = streaming.stream_kmeans(stream, k)
+        print(f"R^4 Control: {len(stream)} hotels, inertia {fit.inertia_}")
+        for beta_method in beta_method_list:
+            for beta in np.ravel(beta_array).tolist():
+                fit = streaming.stream_kmeans(stream, k, method=beta_method, beta=beta)
+                print(f"{beta_method} {beta}: inertia {fit.inertia_}")
+        sys.exit()
+
+    if os.path.isdir(hotels_path):
+        hotel_vectors_r3 = columnar.hotel_vectors(columnar.load_hotels(hotels_path))
+    else:
+        hotel_vectors_r3 = cubic_spline.retrieve_hotel_data(hotels_path)
 
-    hw_cubic_spline, hw_cubic_spline_scaled = cubic_spline.create_cubic_splines(true_path)
+    scaled_vectors_r3 = StandardScaler().fit(hotel_vectors_r3).transform(hotel_vectors_r3)
 
 
     ######################################
     ### Reformatting Data ###
     ######################################
 
-    ### Add signed distance to highway
-    hotel_vectors_r4 = cubic_spline.reformat_data(hotel_vectors_r3, hw_cubic_spline)
+    ### Add signed distance to highway, reused from cache/ while path and hotels are unchanged
+    signed_distance_cache = DiskCache("cache/signed_distance")
+    hotel_vectors_r4 = cubic_spline.reformat_data(hotel_vectors_r3, hw_cubic_spline,
+                                                  cache=signed_distance_cache, workers=workers)
     scaled_vectors_r4 = StandardScaler().fit(hotel_vectors_r4).transform(hotel_vectors_r4)
 
     #####################################
     ### Clustering ###
     #####################################
 
+    ### Every fit is reused from cache/kmeans while data and settings are unchanged
+    ### (clustering_cache.clear() forces new fits)
+    clustering_cache = KMeansCache("cache/kmeans")
 
     ### Run kmeans++ algorithm on R^4
-    kmeans_r4 = KMeans(n_clusters=k, init='k-means++')
-    estimator_r4 = kmeans_r4.fit(scaled_vectors_r4)
+    kmeans_r4 = clustering_cache.fit(scaled_vectors_r4, k, init='k-means++')
 
     ### Run kmeans++ algorithm on R^3
-    kmeans_r3 = KMeans(n_clusters=k, init='k-means++')
-    estimator_r3 = kmeans_r3.fit(scaled_vectors_r3)
+    kmeans_r3 = clustering_cache.fit(scaled_vectors_r3, k, init='k-means++')
 
     ######################################
     ### Interpret ###
@@ -146,8 +186,26 @@ if __name__ == "__main__":
     # visualize_clusters.temp_variability_demo(scaled_vectors_r3, hw_cubic_spline_scaled, title="repeated_control_r3_greedy")
     # visualize_clusters.temp_variability_demo(scaled_vectors_r4, hw_cubic_spline_scaled, title="repeated_control_r4_vanilla")
     ## Manually change Beta value ( * signed distance)
+    plot_results = []
+    if not adaptive:
+        sweep_table = beta_sweep.run_sweep(scaled_vectors_r4, beta_method_list, k=k, workers=workers,
+                                           continuation=continuation,
+                                           cache=None if continuation else clustering_cache)
     for beta_method in beta_method_list:
-        visualize_clusters.increment_beta_values(scaled_vectors_r4, hw_cubic_spline_scaled, name,
-                                                    k, n, method=beta_method, final_beta_list=beta_array)
+        if adaptive:
+            beta_scores = beta_sweep.adaptive_sweep(scaled_vectors_r4, beta_method, k=k,
+                                                    cache=clustering_cache)
+        else:
+            beta_scores = beta_sweep.method_scores(sweep_table, beta_method)
+        plot_results.append(
+            visualize_clusters.beta_increment_result(scaled_vectors_r4, hw_cubic_spline_scaled, name,
+                                                     k, n, method=beta_method, final_beta_list=beta_array,
+                                                     beta_scores=beta_scores, cache=clustering_cache)
+        )
+
+    ### Rendering, one process per plot when workers allows
+    if plots:
+        for path in visualize_clusters.render_results(plot_results, workers=workers):
+            print(path)
 
     # input("Press enter to end program.")
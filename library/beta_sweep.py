@@ -0,0 +1,355 @@
+"""
+beta_sweep.py
+Created by Camila Pierce
+Last Updated 10.17.2026
+
+Runs the k-means fits of beta sweeps (every method, beta and seed) in a process pool and
+collects their scores in one table. Each worker gets the data once and is limited to a
+single BLAS/OpenMP thread, so workers do not oversubscribe the cores. Sweeps can also be
+run as warm-started continuations, each beta starting from the previous beta's centers.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from sklearn.cluster import KMeans
+from sklearn.metrics import adjusted_rand_score
+from threadpoolctl import threadpool_limits
+from library.cluster_metrics import ari_to_reference
+from library.sweep_kmeans import SweepKMeans
+from library.visualize_clusters import beta_range, modify_data, modify_data_batch
+
+_worker_data = None
+_worker_limits = None
+
+
+def run_sweep(
+    data_vectors,
+    methods=("scaling", "adding", "bool_value"),
+    betas=None,
+    seeds=(0,),
+    k=4,
+    init="k-means++",
+    workers=None,
+    threads_per_worker=1,
+    continuation=False,
+    engine="sklearn",
+    cache=None,
+    verbose=True,
+):
+    """
+    Fits k-means for every (method, beta, seed) and scores it with adjusted_rand_score
+    against the left/right side of highway labels, as increment_beta_values does.
+
+    Parameters:
+    * data_vectors (numpy array) : R^4 hotel data vectors
+    * methods (list of str) : beta methods, see visualize_clusters.modify_data
+    * betas (list of floats) : beta values, defaults to beta_range()
+    * seeds (list of ints) : KMeans random_state values, results repeat exactly for a seed
+    * k (int) : number of clusters
+    * init (str) : KMeans init
+    * workers (int) : number of processes, None uses every core, 1 runs in this process
+    * threads_per_worker (int) : BLAS/OpenMP threads allowed in each process
+    * continuation (bool) : if true, each (method, seed) runs as one continuation_sweep
+        over the betas, and the pool splits those chains instead of single fits
+    * engine (str) : sklearn fits each beta with KMeans, lockstep fits all betas of a
+        (method, seed) together with sweep_kmeans.SweepKMeans (only init="k-means++")
+    * cache (KMeansCache) : if given, fits already run are loaded from it and new ones
+        stored, workers share it (sklearn engine without continuation only)
+    * verbose (bool) : print progress and wall clock time
+
+    Returns:
+        Dictionary table with one row per fit, in grid order: method (str), beta (float),
+        seed (int), score (float), inertia (float), n_iter (int), labels (int array (rows, n)),
+        jump (bool, see continuation_sweep)
+    """
+    betas = beta_range() if betas is None else betas
+    grid = [(method, beta, seed) for method in methods for beta in betas for seed in seeds]
+    if continuation and engine == "lockstep":
+        raise ValueError("continuation runs betas in order, it cannot use the lockstep engine")
+    if cache is not None and (continuation or engine != "sklearn"):
+        raise ValueError("only single sklearn fits are cached, not continuation or lockstep sweeps")
+    chained = continuation or engine == "lockstep"
+    if chained:
+        tasks = [(method, betas, seed) for method in methods for seed in seeds]
+        fit = _chain_task if continuation else _lockstep_task
+    elif engine == "sklearn":
+        tasks = grid
+        fit = _fit_task if cache is None else partial(_fit_task, cache=cache)
+    else:
+        raise ValueError(f"Unknown engine {engine}")
+    workers = workers or os.cpu_count()
+    started = time.perf_counter()
+    if workers == 1:
+        done = (fit(data_vectors, k, init, task) for task in tasks)
+        results = _collect(done, len(tasks), started, verbose)
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(data_vectors, threads_per_worker),
+        ) as executor:
+            chunksize = max(1, len(tasks) // (4 * workers))
+            done = executor.map(
+                _worker_fit, [fit] * len(tasks), tasks, [k] * len(tasks), [init] * len(tasks),
+                chunksize=chunksize,
+            )
+            results = _collect(done, len(tasks), started, verbose)
+
+    if chained:
+        # chains come back per (method, seed), rows are put back in grid order
+        by_task = {}
+        for (method, _, seed), chain in zip(tasks, results):
+            by_task.update({(method, beta, seed): row for beta, row in zip(betas, chain)})
+        results = [by_task[task] for task in grid]
+    return _table(grid, results, data_vectors)
+
+
+def continuation_sweep(
+    data_vectors,
+    method="scaling",
+    betas=None,
+    seed=0,
+    k=4,
+    init="k-means++",
+    jump_threshold=0.5,
+    compare_cold=False,
+    verbose=True,
+):
+    """
+    Beta sweep where each fit starts from the previous beta's cluster centers.
+
+    Adjacent betas give almost the same data, so the previous centers (fourth coordinate
+    recomputed from the new transform over the previous members) are a close start and
+    KMeans runs with n_init=1. Labels are renumbered to match the previous beta's clusters.
+    If the labeling jumps (ARI with the previous labels below jump_threshold) a cold start is
+    also fit and the lower inertia kept, so the warm path does not stay in an old optimum.
+
+    Parameters:
+    * data_vectors (numpy array) : R^4 hotel data vectors
+    * method (str) : beta method, see visualize_clusters.modify_data
+    * betas (list of floats) : beta values in sweep order, defaults to beta_range()
+    * seed (int) : KMeans random_state
+    * k (int) : number of clusters
+    * init (str) : KMeans init of the first (cold) fit
+    * jump_threshold (float) : ARI between consecutive labelings counted as a jump
+    * compare_cold (bool) : also fit every beta cold and report Lloyd iterations saved
+    * verbose (bool) : print iteration summary
+
+    Returns:
+        Dictionary table as run_sweep, for one method and seed.
+    """
+    betas = beta_range() if betas is None else betas
+    rows = _chain_task(data_vectors, k, init, (method, betas, seed), jump_threshold)
+    table = _table([(method, beta, seed) for beta in betas], rows, data_vectors)
+    if compare_cold:
+        cold = [_fit_task(data_vectors, k, init, (method, beta, seed))[1] for beta in betas]
+        table["cold_n_iter"] = np.array(cold, dtype=int)
+    if verbose:
+        summary = f"{method}: {table['n_iter'].sum()} Lloyd iterations, {table['jump'].sum()} jumps"
+        if compare_cold:
+            saved = table["cold_n_iter"].sum() - table["n_iter"].sum()
+            summary += f", {saved} saved against {table['cold_n_iter'].sum()} cold"
+        print(summary)
+    return table
+
+
+def adaptive_sweep(
+    data_vectors,
+    method="scaling",
+    start=0.1,
+    stop=5,
+    coarse=11,
+    tolerance=0.02,
+    min_width=0.05,
+    max_fits=None,
+    seed=0,
+    k=4,
+    init="k-means++",
+    return_best=False,
+    cache=None,
+):
+    """
+    Beta sweep that only refines where the score changes.
+
+    Starts from a coarse grid, then repeatedly fits the midpoint of every interval wider
+    than min_width whose end scores differ by more than tolerance, and of the intervals
+    next to the best beta so far. Stops when no interval qualifies or after max_fits fits.
+
+    Parameters:
+    * data_vectors (numpy array) : R^4 hotel data vectors
+    * method (str) : beta method, see visualize_clusters.modify_data
+    * start (float) : starting beta value
+    * stop (float) : ending beta value
+    * coarse (int) : number of evenly spaced betas fit first
+    * tolerance (float) : adjusted_rand_score change that is refined
+    * min_width (float) : intervals are not split below this width
+    * max_fits (int) : fit budget, None for no limit
+    * seed (int) : KMeans random_state, each beta is fit once
+    * k (int) : number of clusters
+    * init (str) : KMeans init
+    * return_best (bool) : also return the beta with the highest score
+    * cache (KMeansCache) : if given, fits already run are loaded from it
+
+    Returns:
+        (betas, scores) sorted by beta, as increment_beta_values' beta_scores,
+        or (betas, scores, best beta) if return_best
+    """
+    scores = {}
+    left_right_labels = _left_right_labels(data_vectors)
+
+    def fit(beta):
+        labels = _fit_task(data_vectors, k, init, (method, beta, seed), cache)[2]
+        scores[beta] = float(ari_to_reference(labels, left_right_labels)[0])
+
+    for beta in np.linspace(start, stop, coarse).tolist():
+        if max_fits is None or len(scores) < max_fits:
+            fit(beta)
+    while max_fits is None or len(scores) < max_fits:
+        betas = sorted(scores)
+        best = max(betas, key=scores.get)
+        splits = []
+        for low, high in zip(betas[:-1], betas[1:]):
+            change = abs(scores[high] - scores[low])
+            if high - low > min_width and (change > tolerance or best in (low, high)):
+                # neighbours of the best beta first, then largest change
+                splits.append((best not in (low, high), -change, (low + high) / 2))
+        if not splits:
+            break
+        for _, _, beta in sorted(splits):
+            if max_fits is not None and len(scores) >= max_fits:
+                break
+            fit(beta)
+
+    betas = sorted(scores)
+    ordered = [scores[beta] for beta in betas]
+    if return_best:
+        return betas, ordered, max(betas, key=scores.get)
+    return betas, ordered
+
+
+def rescale_centers(centers, labels, modified_data):
+    """
+    Returns copy of centers with the fourth coordinate set to the mean of the new
+    transform's fourth column over each cluster's members. Empty clusters keep theirs.
+    """
+    centers = np.array(centers, dtype=float)
+    counts = np.bincount(labels, minlength=len(centers))
+    sums = np.bincount(labels, weights=modified_data[:, 3], minlength=len(centers))
+    filled = counts > 0
+    centers[filled, 3] = sums[filled] / counts[filled]
+    return centers
+
+
+def match_labels(previous, labels, k):
+    """
+    Renumbers labels so each cluster keeps the number of the previous cluster it overlaps most.
+
+    Returns:
+        (renumbered labels, permutation) where permutation[old label] is the new label.
+    """
+    overlap = np.bincount(previous * k + labels, minlength=k * k).reshape(k, k)
+    previous_ix, label_ix = linear_sum_assignment(overlap, maximize=True)
+    permutation = np.empty(k, dtype=int)
+    permutation[label_ix] = previous_ix
+    return permutation[labels], permutation
+
+
+def _table(grid, results, data_vectors):
+    columns = list(zip(*results)) if results else [()] * 4
+    inertias, n_iters, labels, jumps = columns
+    labels = np.array(labels, dtype=np.int32).reshape(len(grid), len(data_vectors))
+    # every row scored against the left/right labels at once
+    scores = ari_to_reference(labels, _left_right_labels(data_vectors)) if len(grid) else []
+    return {
+        "method": np.array([task[0] for task in grid], dtype=str),
+        "beta": np.array([task[1] for task in grid], dtype=float),
+        "seed": np.array([task[2] for task in grid], dtype=int),
+        "score": np.array(scores, dtype=float),
+        "inertia": np.array(inertias, dtype=float),
+        "n_iter": np.array(n_iters, dtype=int),
+        "labels": labels,
+        "jump": np.array(jumps, dtype=bool),
+    }
+
+
+def _left_right_labels(data_vectors):
+    return np.where(data_vectors[:, 3] > 0, 0, 1)
+
+
+def method_scores(table, method):
+    """
+    Returns (betas, scores) of one method from a run_sweep table, scores averaged over seeds.
+    Can be passed to visualize_clusters.increment_beta_values as beta_scores.
+    """
+    rows = table["method"] == method
+    betas, inverse = np.unique(table["beta"][rows], return_inverse=True)
+    scores = np.bincount(inverse, weights=table["score"][rows]) / np.bincount(inverse)
+    return betas.tolist(), scores.tolist()
+
+
+def _collect(tasks, total, started, verbose):
+    results = []
+    step = max(1, -(-total // 10))
+    for done, result in enumerate(tasks, start=1):
+        results.append(result)
+        if verbose and (done % step == 0 or done == total):
+            print(f"{done}/{total} fits, {time.perf_counter() - started:.1f}s")
+    return results
+
+
+def _fit_task(data_vectors, k, init, task, cache=None):
+    method, beta, seed = task
+    modified_data = modify_data(data_vectors, beta, method)
+    if cache is not None:
+        kmeans = cache.fit(modified_data, k, init, seed, method, beta)
+    else:
+        kmeans = KMeans(n_clusters=k, init=init, random_state=seed).fit(modified_data)
+    return kmeans.inertia_, kmeans.n_iter_, kmeans.labels_, False
+
+
+def _chain_task(data_vectors, k, init, chain, jump_threshold=0.5):
+    method, betas, seed = chain
+    sweep = modify_data_batch(data_vectors, betas, method, lazy=True)
+    rows, previous = [], None
+    for modified_data in sweep:
+        jump = False
+        if previous is None:
+            kmeans = KMeans(n_clusters=k, init=init, random_state=seed).fit(modified_data)
+            n_iter = kmeans.n_iter_
+        else:
+            start = rescale_centers(previous.cluster_centers_, previous.labels_, modified_data)
+            kmeans = KMeans(n_clusters=k, init=start, n_init=1, random_state=seed).fit(modified_data)
+            n_iter = kmeans.n_iter_
+            if adjusted_rand_score(previous.labels_, kmeans.labels_) < jump_threshold:
+                jump = True
+                cold = KMeans(n_clusters=k, init=init, random_state=seed).fit(modified_data)
+                n_iter += cold.n_iter_
+                if cold.inertia_ < kmeans.inertia_:
+                    kmeans = cold
+            labels, permutation = match_labels(previous.labels_, kmeans.labels_, k)
+            kmeans.labels_ = labels
+            kmeans.cluster_centers_ = kmeans.cluster_centers_[np.argsort(permutation)]
+        rows.append((kmeans.inertia_, n_iter, kmeans.labels_, jump))
+        previous = kmeans
+    return rows
+
+
+def _lockstep_task(data_vectors, k, init, chain):
+    method, betas, seed = chain
+    sweep = modify_data_batch(data_vectors, betas, method, lazy=True)
+    fits = SweepKMeans(n_clusters=k, random_state=seed).fit(sweep)
+    return [(fit.inertia_, fit.n_iter_, fit.labels_, False) for fit in fits]
+
+
+def _init_worker(data_vectors, threads_per_worker):
+    global _worker_data, _worker_limits
+    _worker_data = data_vectors
+    # kept for the life of the worker
+    _worker_limits = threadpool_limits(limits=threads_per_worker)
+
+
+def _worker_fit(fit, task, k, init):
+    return fit(_worker_data, k, init, task)
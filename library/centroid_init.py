@@ -6,10 +6,6 @@ Last Updated 8.14.2024
 Functions for determining specific initializations.
 """
 import numpy as np
-import math
-from scipy.integrate import quad
-import numpy.polynomial.polynomial as np_poly
-from scipy.optimize import minimize
 
 def find_centroid(data, dimension_indexes = (0, 1)):
     centroid = []
@@ -25,15 +21,7 @@ def find_closest_point(modded_data, centroid):
     """
     Finds closest point to centroid.
     """
-    min_distance = float("inf")
-    min_index = -1
-
-    for ix, point in enumerate(modded_data):
-        dist = math.dist(centroid, point)
-        if dist < min_distance:
-            min_distance = dist
-            min_index = ix
-    return min_index
+    return int(np.argmin(squared_distances(modded_data, centroid)))
 
 # def find_furthest_point(modded_data, c_list):
 #     max_distance = float("-inf")
@@ -50,37 +38,38 @@ def find_furthest_point(modded_data, c_list):
     """
     Finds furthest point from every point in c_list. See K-Means++ details for specifics
     """
-    max_distance = float("-inf")
-    max_index = -1
+    closest = np.min([squared_distances(modded_data, c_x) for c_x in c_list], axis=0)
+    return int(np.argmax(closest))
 
-    for ix, point in enumerate(modded_data):
-        dist = min([math.dist(c_x, point) for c_x in c_list])
-        if dist >  max_distance:
-             max_distance = dist
-             max_index = ix
-    return  max_index
+
+def squared_distances(modded_data, point):
+    """
+    Squared distance of every row of modded_data to point, same order as math.dist.
+    """
+    difference = np.asarray(modded_data, dtype=float) - np.asarray(point, dtype=float)
+    return np.einsum("ij,ij->i", difference, difference)
 
 
 def create_init_vectors(r_x_data, dims, k):
     """
     Create init vectors based on mass centers - can select choice dimensions with dims
 
+    Farthest point traversal: a running minimum distance to the chosen points is updated
+    once per new point, so the same indexes as repeated find_furthest_point come out in O(n*k).
+
     Returns array size (k, n_features)
     """
     center = find_centroid(r_x_data, dims)
     r_4_modded = mod_data(r_x_data, dims)
     first_index = find_closest_point(r_4_modded, center)
     n = [first_index]
+    closest = squared_distances(r_4_modded, r_4_modded[first_index])
     while len(n) < k:
-        next_index = find_furthest_point(r_4_modded, [r_4_modded[i] for i in n])
+        next_index = int(np.argmax(closest))
         n.append(next_index)
+        np.minimum(closest, squared_distances(r_4_modded, r_4_modded[next_index]), out=closest)
     return [r_x_data[i] for i in n] #returns list of initialization vectors
 
-def reshape_cubic_coeff(array):
-    new_shape = array.shape[::-1]
-    flat = array.flatten(order = "F")
-    return np.reshape(flat, new_shape)
-
 
 def arc_length_div_init(cubic_spline, k, data):
     """
@@ -88,25 +77,9 @@ def arc_length_div_init(cubic_spline, k, data):
 
     Returns array size (k, n_features)
     """
-    total_length=0
-    #reformat coeff
-    cubic_coeff = reshape_cubic_coeff(cubic_spline.c)
-    for i in range(len(cubic_spline.x)-1):
-        a = cubic_spline.x[i]
-        b = cubic_spline.x[i+1]
-        h = h_of_x(cubic_coeff[i])#simplification of arc length funciton
-        total_length += quad(h, a, b)[0]
-
-    unit_length = total_length / (k-1)
-    x_values = []
-    for i in range(k):
-        goal_arc_length = i * unit_length
-        goal_fxn = arc_length_goal_fxn(cubic_spline, cubic_coeff, goal_arc_length)
-        result = minimize(goal_fxn, (cubic_spline.x[0]+goal_arc_length)).x
-        if len(result) > 1:
-            print("multiple results yielded")
-        else:
-            x_values.extend(result)
+    table = ArcLengthTable(cubic_spline)
+    unit_length = table.total_length / (k-1)
+    x_values = table.x_at(np.arange(k) * unit_length)
 
     print("expected first and last:", cubic_spline.x[0], cubic_spline.x[-1])
     print("final x values", x_values)
@@ -120,41 +93,58 @@ def arc_length_div_init(cubic_spline, k, data):
     return np.array(init_vectors)
 
 
-    #.x breakpoints .c coefficients
-
-def h_of_x(cubic_coeff):
+class ArcLengthTable:
     """
-    sqrt(1 + f'(x)^2)
+    Cumulative arc length of a cubic spline, integrated once with fixed order Gauss-Legendre
+    quadrature over every segment at the same time.
+
+    Parameters:
+    * cubic_spline (CubicSpline) : highway spline
+    * order (int) : Gauss-Legendre nodes per segment (exact for polynomials of degree 2*order - 1)
     """
-    p = np_poly.polyder(cubic_coeff)#derive segment of cubic spline
-    sq_p = np_poly.polypow(p, 2)#square
-    def special_fxn(x):
-        y = math.sqrt(1 + (np.polynomial.polynomial.Polynomial(sq_p)(x)))
-        return y
-    return special_fxn
-
-def arc_length_goal_fxn(cubic_spline, coeffs, goal_arc_length):
-    #create cubic spline
-    #(h(x)-s)^2
-    def special_fxn(x):
-        #pre-integrated
-        #go through segements until x < start of next segement.
-        #raise error if before first breakpoint
-        #total length as passing through until desired segment
-        #from there, find until just x, add to total
-        #return total
-        if x < cubic_spline.x[0]:
-            return float("inf")#
-        length = 0
-        last_bp = cubic_spline.x[-1]
-        for i in range(len(cubic_spline.x)-1):
-            a = cubic_spline.x[i]
-            b = cubic_spline.x[i+1]
-            coeff = coeffs[i]
-            if x < b:
-                return (length + quad(h_of_x(coeff), a, x)[0] - goal_arc_length)**2
-            else:
-                length += quad(h_of_x(coeff), a, b)[0]
-        return (length + quad(h_of_x(coeff), last_bp, x)[0] - goal_arc_length)**2
-
-    return special_fxn
+
+    def __init__(self, cubic_spline, order=32):
+        self.breakpoints = cubic_spline.x
+        self.derivative = cubic_spline.derivative()
+        self.nodes, self.weights = np.polynomial.legendre.leggauss(order)
+        segment_lengths = self._integrate(self.breakpoints[:-1], self.breakpoints[1:])
+        self.cumulative = np.concatenate(([0], np.cumsum(segment_lengths)))
+        self.total_length = self.cumulative[-1]
+
+    def _speed(self, x):
+        """
+        sqrt(1 + f'(x)^2)
+        """
+        return np.sqrt(1 + self.derivative(x) ** 2)
+
+    def _integrate(self, a, b):
+        half = (b - a) / 2
+        x = (a + half)[..., np.newaxis] + half[..., np.newaxis] * self.nodes
+        return half * (self._speed(x) @ self.weights)
+
+    def _segment(self, x):
+        return np.clip(np.searchsorted(self.breakpoints, x, side="right") - 1, 0, len(self.breakpoints) - 2)
+
+    def length_at(self, x):
+        """
+        Arc length from the first breakpoint to x, for a float or array of x.
+        """
+        x = np.asarray(x, dtype=float)
+        segment = self._segment(x)
+        return self.cumulative[segment] + self._integrate(self.breakpoints[segment], x)
+
+    def x_at(self, length, newton_steps=4):
+        """
+        x at which arc length from the first breakpoint reaches length, for a float or array.
+
+        Starts from linear interpolation inside the segment found by searchsorted on the
+        cumulative lengths, then takes Newton steps (d length / dx is the speed).
+        """
+        length = np.asarray(length, dtype=float)
+        segment = np.clip(np.searchsorted(self.cumulative, length, side="right") - 1, 0, len(self.breakpoints) - 2)
+        start, stop = self.breakpoints[segment], self.breakpoints[segment + 1]
+        fraction = (length - self.cumulative[segment]) / (self.cumulative[segment + 1] - self.cumulative[segment])
+        x = start + fraction * (stop - start)
+        for _ in range(newton_steps):
+            x = x - (self.length_at(x) - length) / self._speed(x)
+        return x
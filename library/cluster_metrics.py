@@ -0,0 +1,188 @@
+"""
+cluster_metrics.py
+Created by Camila Pierce
+Last Updated 10.17.2026
+
+Scores for many clusterings of the same data at once. Labelings are rows of an
+(n_runs, n) integer matrix. The contingency tables of every pair of labelings are counted
+with one bincount over combined label codes, then adjusted rand index and normalized
+mutual information are computed from the tables as arrays. Results match
+sklearn.metrics.adjusted_rand_score and normalized_mutual_info_score.
+"""
+import numpy as np
+from scipy.spatial.distance import cdist
+
+
+def contingency_tables(labels_a, labels_b, k_a=None, k_b=None):
+    """
+    Contingency table of each pair of rows of two label matrices.
+
+    Parameters:
+    * labels_a (numpy array) : (n_pairs, n) labels from 0 to k_a - 1
+    * labels_b (numpy array) : (n_pairs, n) labels from 0 to k_b - 1
+    * k_a (int) : number of labels in labels_a, defaults to its max + 1
+    * k_b (int) : number of labels in labels_b, defaults to its max + 1
+
+    Returns:
+        numpy array (n_pairs, k_a, k_b), [p, i, j] counts points labeled i in row p of
+        labels_a and j in row p of labels_b
+    """
+    labels_a = np.atleast_2d(labels_a).astype(np.int64)
+    labels_b = np.atleast_2d(labels_b).astype(np.int64)
+    k_a = int(labels_a.max()) + 1 if k_a is None else k_a
+    k_b = int(labels_b.max()) + 1 if k_b is None else k_b
+    n_pairs = len(labels_a)
+    codes = labels_a * k_b + labels_b
+    codes += (np.arange(n_pairs) * (k_a * k_b))[:, np.newaxis]
+    return np.bincount(codes.ravel(), minlength=n_pairs * k_a * k_b).reshape(n_pairs, k_a, k_b)
+
+
+def ari_from_tables(tables):
+    """
+    Adjusted rand index of each (n_pairs, k_a, k_b) contingency table.
+    """
+    tables = np.asarray(tables, dtype=float)
+    n = tables.sum(axis=(1, 2))
+    index = _pairs(tables).sum(axis=(1, 2))
+    rows = _pairs(tables.sum(axis=2)).sum(axis=1)
+    columns = _pairs(tables.sum(axis=1)).sum(axis=1)
+    expected = rows * columns / np.maximum(_pairs(n), 1)
+    maximum = (rows + columns) / 2
+    # identical trivial labelings (one cluster or all singletons) score 1, as in sklearn
+    denominator = maximum - expected
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(denominator == 0, 1.0, (index - expected) / denominator)
+
+
+def nmi_from_tables(tables):
+    """
+    Normalized mutual information (arithmetic mean of entropies) of each contingency table.
+    """
+    tables = np.asarray(tables, dtype=float)
+    n = tables.sum(axis=(1, 2))[:, np.newaxis]
+    p_ab = tables / n[:, :, np.newaxis]
+    p_a = tables.sum(axis=2) / n
+    p_b = tables.sum(axis=1) / n
+    outer = p_a[:, :, np.newaxis] * p_b[:, np.newaxis, :]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mutual = np.where(p_ab > 0, p_ab * np.log(p_ab / outer), 0).sum(axis=(1, 2))
+        entropy_a = -np.where(p_a > 0, p_a * np.log(p_a), 0).sum(axis=1)
+        entropy_b = -np.where(p_b > 0, p_b * np.log(p_b), 0).sum(axis=1)
+    normalizer = np.maximum((entropy_a + entropy_b) / 2, np.finfo(float).eps)
+    single = (entropy_a == 0) & (entropy_b == 0)
+    return np.where(single, 1.0, np.maximum(mutual, 0) / normalizer)
+
+
+def ari_to_reference(labels, reference):
+    """
+    adjusted_rand_score of every row of labels against one reference labeling.
+
+    Parameters:
+    * labels (numpy array) : (n_runs, n) labels from 0 to k - 1
+    * reference (numpy array) : (n,) labels, any values
+
+    Returns:
+        numpy array (n_runs,)
+    """
+    return ari_from_tables(_reference_tables(labels, reference))
+
+
+def nmi_to_reference(labels, reference):
+    """
+    normalized_mutual_info_score of every row of labels against one reference labeling.
+    """
+    return nmi_from_tables(_reference_tables(labels, reference))
+
+
+def pairwise_ari(labels, chunk_elements=1 << 24):
+    """
+    adjusted_rand_score between every pair of rows of labels.
+
+    Parameters:
+    * labels (numpy array) : (n_runs, n) labels from 0 to k - 1
+    * chunk_elements (int) : label codes counted per bincount, bounds memory for many runs
+
+    Returns:
+        Symmetric numpy array (n_runs, n_runs) with ones on the diagonal
+    """
+    return _pairwise(labels, ari_from_tables, chunk_elements)
+
+
+def pairwise_nmi(labels, chunk_elements=1 << 24):
+    """
+    normalized_mutual_info_score between every pair of rows of labels, see pairwise_ari.
+    """
+    return _pairwise(labels, nmi_from_tables, chunk_elements)
+
+
+def sampled_silhouette(data, labels, sample_size=1000, random_state=0):
+    """
+    Silhouette score of every labeling, on one random sample of the data shared by all runs.
+    Distances between sampled points are computed once; the mean distance of each point to
+    each cluster of every run then comes from one matrix product with one-hot labels.
+
+    Parameters:
+    * data (numpy array) : (n, d) clustered data
+    * labels (numpy array) : (n_runs, n) labels from 0 to k - 1
+    * sample_size (int) : points sampled, every point if n is smaller
+    * random_state (int) : seed of the sample
+
+    Returns:
+        numpy array (n_runs,), as sklearn.metrics.silhouette_score on the sample
+    """
+    labels = np.atleast_2d(labels).astype(np.int64)
+    n_runs, n = labels.shape
+    if n > sample_size:
+        sample = np.random.default_rng(random_state).choice(n, sample_size, replace=False)
+    else:
+        sample = np.arange(n)
+    distances = cdist(data[sample], data[sample])
+    labels = labels[:, sample]
+    k = int(labels.max()) + 1
+    s = len(sample)
+
+    # one-hot (s, n_runs * k), column run * k + cluster
+    one_hot = np.zeros((s, n_runs * k))
+    one_hot[np.arange(s)[:, np.newaxis], labels.T + np.arange(n_runs) * k] = 1
+    sums = (distances @ one_hot).reshape(s, n_runs, k)
+    counts = one_hot.sum(axis=0).reshape(n_runs, k)
+
+    own = labels.T[:, :, np.newaxis]
+    own_count = np.take_along_axis(np.broadcast_to(counts, (s, n_runs, k)), own, axis=2)[:, :, 0]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        inside = np.take_along_axis(sums, own, axis=2)[:, :, 0] / (own_count - 1)
+        means = sums / counts
+    np.put_along_axis(means, own, np.inf, axis=2)
+    means[:, counts == 0] = np.inf
+    nearest = means.min(axis=2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scores = (nearest - inside) / np.maximum(inside, nearest)
+    # members of single point clusters score 0, as in sklearn
+    scores = np.where(own_count > 1, np.nan_to_num(scores), 0)
+    return scores.mean(axis=0)
+
+
+def _pairs(counts):
+    return counts * (counts - 1) / 2
+
+
+def _reference_tables(labels, reference):
+    labels = np.atleast_2d(labels)
+    reference = np.unique(reference, return_inverse=True)[1].ravel()
+    return contingency_tables(labels, np.broadcast_to(reference, labels.shape))
+
+
+def _pairwise(labels, score, chunk_elements):
+    labels = np.atleast_2d(labels)
+    n_runs, n = labels.shape
+    k = int(labels.max()) + 1
+    first, second = np.triu_indices(n_runs, 1)
+    scores = np.ones((n_runs, n_runs))
+    step = max(1, chunk_elements // max(n, 1))
+    for start in range(0, len(first), step):
+        pairs = slice(start, start + step)
+        tables = contingency_tables(labels[first[pairs]], labels[second[pairs]], k, k)
+        values = score(tables)
+        scores[first[pairs], second[pairs]] = values
+        scores[second[pairs], first[pairs]] = values
+    return scores
@@ -0,0 +1,212 @@
+"""
+clustering_result.py
+Created by Camila Pierce
+Last Updated 10.17.2026
+
+Array-backed result of one clustering. Members are stored once, sorted by cluster, with
+per-cluster offsets (as in a CSR matrix), so each cluster's members are a view. Convex
+hulls are kept as vertex indices. Results save to and load from a single .npz file.
+
+Also holds hull_overlaps, the pairwise hull overlap used by visualize_clusters, indexed by
+cluster label.
+"""
+import numpy as np
+from scipy.sparse import coo_array, csr_array
+from scipy.spatial import ConvexHull
+import shapely
+from shapely import STRtree
+
+
+class ClusteringResult:
+    """
+    Labels, centers, members and hulls of one clustering.
+
+    Attributes:
+    * labels (numpy array) : (n,) cluster of each data vector
+    * order (numpy array) : (n,) data indexes sorted by cluster, members of cluster i are
+        order[offsets[i]:offsets[i + 1]]
+    * offsets (numpy array) : (k + 1,) start of each cluster in order
+    * vectors (numpy array) : (n, d) data vectors in the same order
+    * centers (numpy array) : (k, d) cluster centers
+    * inertia (float) : k-means inertia
+    * hull_vertices (numpy array) : data indexes of every hull's vertices, counterclockwise,
+        hull of cluster i is hull_vertices[hull_offsets[i]:hull_offsets[i + 1]]
+    * hull_offsets (numpy array) : (k + 1,) start of each hull in hull_vertices
+    * areas (numpy array) : (k,) ConvexHull.area of each hull (its perimeter in 2d, as in
+        visualize_clusters), 0 for clusters of less than three members
+    * overlap (float) : total pairwise overlap area of the hulls
+
+    ConvexHull objects built by from_fit are kept (not saved) so to_dict does not rebuild them.
+    """
+
+    _FIELDS = ("labels", "order", "offsets", "vectors", "centers", "inertia",
+               "hull_vertices", "hull_offsets", "areas", "overlap")
+    __slots__ = _FIELDS + ("_convex_hulls",)
+
+    def __init__(self, labels, order, offsets, vectors, centers, inertia, hull_vertices, hull_offsets,
+                 areas, overlap, convex_hulls=None):
+        self.labels = labels
+        self.order = order
+        self.offsets = offsets
+        self.vectors = vectors
+        self.centers = centers
+        self.inertia = inertia
+        self.hull_vertices = hull_vertices
+        self.hull_offsets = hull_offsets
+        self.areas = areas
+        self.overlap = overlap
+        # indexes tuple : ConvexHull (or None) of every cluster
+        self._convex_hulls = {} if convex_hulls is None else convex_hulls
+
+    @classmethod
+    def from_fit(cls, data_vectors, kmeans_object, num_clusters=None, indexes=(0, 1)):
+        """
+        Groups data by the labels of a fitted KMeans (or KMeansFit) and builds hulls.
+
+        Parameters:
+        * data_vectors (numpy array) : data that was clustered
+        * kmeans_object (KMeans) : fitted clustering with labels_, cluster_centers_, inertia_
+        * num_clusters (int) : number of clusters, defaults to number of centers
+        * indexes (tuple) : columns hulls are built in, geographic by default
+        """
+        data_vectors = np.asarray(data_vectors)
+        centers = np.asarray(kmeans_object.cluster_centers_)
+        k = len(centers) if num_clusters is None else num_clusters
+        labels = np.asarray(kmeans_object.labels_)
+        order = np.argsort(labels, kind="stable")
+        offsets = np.zeros(k + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=k), out=offsets[1:])
+        vectors = data_vectors[order]
+
+        hulls, convex_hulls, areas = [], [], np.zeros(k)
+        for cluster in range(k):
+            points = vectors[offsets[cluster]:offsets[cluster + 1]][:, list(indexes)]
+            if len(points) > 2:
+                hull = ConvexHull(points)
+                hulls.append(order[offsets[cluster] + hull.vertices])
+                convex_hulls.append(hull)
+                areas[cluster] = hull.area
+            else:
+                hulls.append(np.empty(0, dtype=order.dtype))
+                convex_hulls.append(None)
+        hull_offsets = np.zeros(k + 1, dtype=np.int64)
+        np.cumsum([len(hull) for hull in hulls], out=hull_offsets[1:])
+        hull_vertices = np.concatenate(hulls)
+
+        borders = [data_vectors[hull][:, list(indexes)] for hull in hulls]
+        overlap = hull_overlaps(borders)[1]
+        return cls(labels, order, offsets, vectors, centers, float(kmeans_object.inertia_),
+                   hull_vertices, hull_offsets, areas, overlap, {tuple(indexes): convex_hulls})
+
+    @property
+    def num_clusters(self):
+        return len(self.offsets) - 1
+
+    def member_indexes(self, cluster):
+        """
+        Data indexes of a cluster's members, a view of order.
+        """
+        return self.order[self.offsets[cluster]:self.offsets[cluster + 1]]
+
+    def members(self, cluster):
+        """
+        Data vectors of a cluster's members, a view of vectors.
+        """
+        return self.vectors[self.offsets[cluster]:self.offsets[cluster + 1]]
+
+    def hull(self, cluster):
+        """
+        Data indexes of a cluster's hull vertices, empty for clusters of less than three
+        members.
+        """
+        return self.hull_vertices[self.hull_offsets[cluster]:self.hull_offsets[cluster + 1]]
+
+    def sizes(self):
+        return np.diff(self.offsets)
+
+    def save(self, file_name):
+        """
+        Writes every array to one .npz file.
+        """
+        np.savez(file_name, **{name: getattr(self, name) for name in self._FIELDS})
+
+    @classmethod
+    def load(cls, file_name):
+        with np.load(file_name) as arrays:
+            fields = {name: arrays[name] for name in cls._FIELDS}
+        fields["inertia"] = float(fields["inertia"])
+        fields["overlap"] = float(fields["overlap"])
+        return cls(**fields)
+
+    def to_dict(self, indexes=(0, 1)):
+        """
+        Old cluster_info dictionary shape of visualize_clusters, with a ConvexHull object
+        for each cluster of three or more members, reused from from_fit (built once for
+        other indexes or loaded results).
+
+        Returns:
+            Dictionary of cluster info {num : (int), inertia : (float), overlap : (float),
+            clusters: {label : (int),
+                cluster_center : (numpy array), area : (float),
+                convex_hull : (ConvexHull), members : (numpy_array)}
+        """
+        convex_hulls = self._convex_hulls.get(tuple(indexes))
+        if convex_hulls is None:
+            convex_hulls = [
+                ConvexHull(self.members(cluster)[:, list(indexes)]) if len(self.hull(cluster)) else None
+                for cluster in range(self.num_clusters)
+            ]
+            self._convex_hulls[tuple(indexes)] = convex_hulls
+        clusters = []
+        for cluster in range(self.num_clusters):
+            info = {
+                "label": cluster,
+                "cluster_center": self.centers[cluster],
+                "area": self.areas[cluster],
+                "members": self.members(cluster),
+            }
+            if convex_hulls[cluster] is not None:
+                info["convex_hull"] = convex_hulls[cluster]
+            clusters.append(info)
+        return {
+            "num": self.num_clusters,
+            "inertia": self.inertia,
+            "overlap": self.overlap,
+            "clusters": clusters,
+        }
+
+
+def hull_overlaps(list_of_convex_borders, factor=1):
+    """
+    Intersection area of every pair of convex hulls, for large numbers of clusters.
+    All hulls are built as one geometry array, an STRtree finds the pairs whose bounding
+    boxes intersect and only those pairs are intersected, in one vectorized call.
+
+    Parameters:
+    * list_of_convex_borders (list) : convex hull vertex points of every cluster, in label
+        order, clusters without a hull (less than three points) may be empty
+    * factor (int) : scaling factor
+
+    Returns:
+        (overlap matrix, total): scipy sparse (k, k) matrix with the overlap area of the
+        hulls of clusters i < j at [i, j], rows and columns of clusters without a hull are
+        0, and total overlap area multiplied by factor
+    """
+    k = len(list_of_convex_borders)
+    borders = [np.asarray(border, dtype=float).reshape(-1, 2) for border in list_of_convex_borders]
+    labels = np.array([label for label, border in enumerate(borders) if len(border) > 2], dtype=np.intp)
+    if len(labels) < 2:
+        return csr_array((k, k)), 0.0
+    borders = [borders[label] for label in labels]
+    hull_ids = np.repeat(np.arange(len(labels)), [len(border) for border in borders])
+    hulls = shapely.polygons(shapely.linearrings(np.vstack(borders), indices=hull_ids))
+
+    left, right = STRtree(hulls).query(hulls, predicate="intersects")
+    pairs = left < right
+    left, right = left[pairs], right[pairs]
+    areas = shapely.area(shapely.intersection(hulls[left], hulls[right]))
+    overlapping = areas > 0
+    overlap = coo_array(
+        (areas[overlapping], (labels[left[overlapping]], labels[right[overlapping]])), shape=(k, k)
+    ).tocsr()
+    return overlap, float(areas.sum()) * factor
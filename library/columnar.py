@@ -0,0 +1,198 @@
+"""
+columnar.py
+Created by Camila Pierce
+Last Updated 10.17.2026
+
+Binary columnar format for hotel data and snapped highway paths. A dataset is a directory
+holding one .npy file per column and a small header.json describing them. Columns are
+opened memory-mapped, so loading a large region reads only the header until the data is
+used. Text columns (names, place ids) are stored as one utf-8 byte array with row offsets.
+
+Converts both ways to the whitespace text files used by the scraping and clustering scripts:
+python -m library.columnar [hotels or path] [source] [destination]
+"""
+import json
+import os
+import sys
+import numpy as np
+from library.cubic_spline import load_hotels as load_hotels_text
+
+FORMAT = "hotel_main.columnar"
+VERSION = 1
+HEADER = "header.json"
+
+
+def save_dataset(directory, kind, columns):
+    """
+    Writes columns to directory as .npy files plus header.json.
+
+    Parameters:
+    * directory (str) : dataset folder, created if missing
+    * kind (str) : "hotels" or "path"
+    * columns (dict) : column name : numpy array, all with the same number of rows
+        (string columns are stored as <name>_data and <name>_offsets)
+    """
+    os.makedirs(directory, exist_ok=True)
+    header = {"format": FORMAT, "version": VERSION, "kind": kind, "columns": {}}
+    for name, values in columns.items():
+        values = np.asarray(values)
+        header["rows"] = len(values)
+        if values.dtype.kind in "US":
+            data, offsets = encode_strings(values)
+            stored = {f"{name}_data": data, f"{name}_offsets": offsets}
+        else:
+            stored = {name: values}
+        for column, array in stored.items():
+            np.save(os.path.join(directory, f"{column}.npy"), array)
+            header["columns"][column] = {"dtype": array.dtype.str, "shape": list(array.shape)}
+    with open(os.path.join(directory, HEADER), "w", encoding="utf-8") as file:
+        json.dump(header, file, indent=1)
+
+
+def load_dataset(directory, kind=None, mmap_mode="r"):
+    """
+    Opens every column of a dataset.
+
+    Parameters:
+    * directory (str) : dataset folder
+    * kind (str) : expected kind, raises ValueError if the dataset holds something else
+    * mmap_mode (str) : passed to numpy.load, None reads columns into memory
+
+    Returns:
+        Dictionary of column name : numpy array (memory-mapped by default).
+    """
+    with open(os.path.join(directory, HEADER), "r", encoding="utf-8") as file:
+        header = json.load(file)
+    if header.get("format") != FORMAT or header.get("version") != VERSION:
+        raise ValueError(f"{directory} is not a version {VERSION} {FORMAT} dataset")
+    if kind is not None and header["kind"] != kind:
+        raise ValueError(f"{directory} holds {header['kind']}, expected {kind}")
+    return {
+        column: np.load(os.path.join(directory, f"{column}.npy"), mmap_mode=mmap_mode)
+        for column in header["columns"]
+    }
+
+
+def encode_strings(values):
+    """
+    Returns (data, offsets): utf-8 bytes of all strings joined as uint8 and int64 offsets,
+    string i is data[offsets[i]:offsets[i + 1]].
+    """
+    encoded = [str(value).encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def decode_strings(dataset, name):
+    """
+    Returns string column name of a loaded dataset as a numpy str array.
+    """
+    data, offsets = dataset[f"{name}_data"], dataset[f"{name}_offsets"]
+    raw = data.tobytes()
+    return np.array(
+        [raw[start:stop].decode("utf-8") for start, stop in zip(offsets[:-1], offsets[1:])],
+        dtype=str,
+    )
+
+
+### Hotels
+
+
+def save_hotels(directory, hotels):
+    """
+    Saves hotel columns (as returned by cubic_spline.load_hotels, place_id optional).
+    """
+    columns = {
+        "name": hotels["name"],
+        "lng": np.asarray(hotels["lng"], dtype=np.float64),
+        "lat": np.asarray(hotels["lat"], dtype=np.float64),
+        "rating": np.asarray(hotels["rating"], dtype=np.float64),
+        "reviews": np.asarray(hotels["reviews"], dtype=np.int64),
+        "place_id": hotels.get("place_id", np.full(len(hotels["name"]), "")),
+    }
+    save_dataset(directory, "hotels", columns)
+
+
+def load_hotels(directory, mmap_mode="r"):
+    """
+    Opens hotel dataset, numeric columns lng, lat, rating, reviews are memory-mapped.
+    Names and place ids are left encoded, see decode_strings.
+    """
+    return load_dataset(directory, "hotels", mmap_mode)
+
+
+def hotel_vectors(hotels):
+    """
+    Same as cubic_spline.retrieve_hotel_data for a loaded dataset: (n, 3) of lng, lat, rating.
+    """
+    return np.column_stack((hotels["lng"], hotels["lat"], hotels["rating"]))
+
+
+def hotels_text_to_binary(text_file, directory):
+    save_hotels(directory, load_hotels_text(text_file))
+
+
+def hotels_binary_to_text(directory, text_file):
+    """
+    Writes hotel dataset in the format of scrape_google_maps.collect_hotels_along_highway.
+    Floats are written with repr, so values read back unchanged.
+    """
+    hotels = load_hotels(directory)
+    names = decode_strings(hotels, "name")
+    with open(text_file, "w", encoding="utf-8") as file:
+        file.write("Abbrv.\tLat\tLong\tRating\tNumber_Of_Reviews\n")
+        for name, lng, lat, rating, reviews in zip(
+            names, hotels["lng"].tolist(), hotels["lat"].tolist(),
+            hotels["rating"].tolist(), hotels["reviews"].tolist()
+        ):
+            file.write(f"{name.replace(' ', '_')}\t{lng!r}\t{lat!r}\t{rating!r}\t{reviews}\n")
+
+
+### Snapped paths
+
+
+def save_path(directory, points):
+    """
+    Saves (n, 2) latitude, longitude points of a snapped highway.
+    """
+    save_dataset(directory, "path", {"points": np.asarray(points, dtype=np.float64)})
+
+
+def load_path(directory, mmap_mode="r"):
+    """
+    Returns memory-mapped (n, 2) latitude, longitude points of a snapped highway.
+    """
+    return load_dataset(directory, "path", mmap_mode)["points"]
+
+
+def path_text_to_binary(text_file, directory):
+    """
+    Converts a highway text file. Like scraping_script.read_data the first line is skipped.
+    """
+    with open(text_file, "r") as file:
+        file.readline()
+        points = np.array(file.read().split(), dtype=np.float64).reshape(-1, 2)
+    save_path(directory, points)
+
+
+def path_binary_to_text(directory, text_file):
+    """
+    Writes points under a header line, so read_data returns every point.
+    """
+    with open(text_file, "w", encoding="utf-8") as file:
+        file.write("Lat Long\n")
+        for lat, lng in load_path(directory).tolist():
+            file.write(f"{lat!r} {lng!r}\n")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] in ("hotels", "path"):
+        kind, source, destination = sys.argv[1:]
+        to_text = {"hotels": hotels_binary_to_text, "path": path_binary_to_text}
+        to_binary = {"hotels": hotels_text_to_binary, "path": path_text_to_binary}
+        convert = to_text[kind] if os.path.isdir(source) else to_binary[kind]
+        convert(source, destination)
+        print(destination)
+    else:
+        print("Error: expected [hotels or path] [source] [destination]")
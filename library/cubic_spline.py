@@ -6,14 +6,19 @@ Set of functions to process and modify data related to highway distance.
 
 Reformatted using black.
 """
+import itertools
 import math
+import os
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 from scipy.optimize import minimize
-from scipy.interpolate import CubicSpline
+from scipy.interpolate import CubicSpline, PPoly
+from scipy.spatial import cKDTree
 from sklearn.preprocessing import StandardScaler
 
 
-def reformat_data(data, highway_spline, decimals = 4):
+def reformat_data(data, highway_spline, decimals = 4, engine="closed_form", cache=None,
+                  workers=1, chunksize=None):
     """
     Takes data of at least x, y and adds smallest distance of each point to highway with given coefficients.
 
@@ -21,23 +26,108 @@ def reformat_data(data, highway_spline, decimals = 4):
     * data (numpy array) :
     * highway_spline (CubicSpline) :
     * decimals (int) : number of decimals to display data to
+    * engine (str or HighwayIndex) : how signed distance is computed
+        -closed_form: every point at once, see batch_signed_distance
+        -kd_tree: builds a HighwayIndex of the spline, only searches segments near each point
+        -minimize: one scipy minimize per point, see create_third_dimension
+        -a prebuilt HighwayIndex of highway_spline is queried directly
+    * cache (DiskCache) : if given, signed distances are looked up by spline coefficients,
+        point coordinates and engine before computing, and saved after
+    * workers (int) : number of processes splitting the points, None uses every core
+    * chunksize (int) : points sent to a process at a time, defaults to a few chunks per process
 
     Returns:
         Copy of numpy array with shortest distance to highway added for each point.
     """
-    r_three = []
-    for data_point in data:
-        r_three.append([create_third_dimension(highway_spline, data_point)])
+    if cache is not None:
+        # engines differ (minimize can stop in a local minimum), so each has its own entry;
+        # a prebuilt HighwayIndex answers as kd_tree
+        key = cache.key(highway_spline.x, highway_spline.c, np.asarray(data, dtype=float)[:, :2],
+                        engine=engine if isinstance(engine, str) else "kd_tree")
+        cached = cache.load(key)
+        if cached is None:
+            r_three = reformat_data(data, highway_spline, decimals, engine,
+                                    workers=workers, chunksize=chunksize)[:, -1:]
+            cache.store(key, signed_distance=r_three)
+        else:
+            r_three = cached["signed_distance"]
+    elif workers != 1:
+        r_three = parallel_signed_distance(data, highway_spline, engine, workers, chunksize)
+        r_three = r_three[:, np.newaxis]
+    else:
+        r_three = _signed_distance_column(data, highway_spline, engine)[:, np.newaxis]
     np.set_printoptions(suppress=True, precision = decimals)
     return np.append(data, r_three, axis=1)
 
 
+def _signed_distance_column(data, highway_spline, engine):
+    if engine == "kd_tree":
+        engine = HighwayIndex(highway_spline)
+    if isinstance(engine, HighwayIndex):
+        return engine.query(data)[2]
+    if engine == "closed_form":
+        return batch_signed_distance(data, highway_spline)[0]
+    if engine == "minimize":
+        return np.array([create_third_dimension(highway_spline, data_point) for data_point in data])
+    raise ValueError(f"Unknown engine {engine}")
+
+
+### Process pool, each worker rebuilds the spline once from its arrays
+_worker_spline = None
+_worker_engine = None
+
+
+def parallel_signed_distance(data, highway_spline, engine="minimize", workers=None, chunksize=None):
+    """
+    Signed distance of every point, computed over chunks of points in a process pool.
+
+    Parameters:
+    * data (numpy array) : array of at least x, y per row
+    * highway_spline (CubicSpline) : cubic spline representation of highway
+    * engine (str) : closed_form, kd_tree or minimize, see reformat_data
+    * workers (int) : number of processes, None uses every core
+    * chunksize (int) : points per task, defaults to four tasks per process
+
+    Returns:
+        Signed distance array in the same order as data.
+    """
+    if not isinstance(engine, str):
+        raise ValueError("Only named engines can run in parallel")
+    points = np.asarray(data, dtype=float)[:, :2]
+    workers = workers or os.cpu_count()
+    if chunksize is None:
+        chunksize = max(1, math.ceil(len(points) / (4 * workers)))
+    chunks = [points[start:start + chunksize] for start in range(0, len(points), chunksize)]
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(highway_spline.x, highway_spline.c, engine),
+    ) as executor:
+        # map keeps the order of the chunks
+        return np.concatenate([np.empty(0)] + list(executor.map(_worker_signed_distance, chunks)))
+
+
+def _init_worker(breakpoints, coefficients, engine):
+    global _worker_spline, _worker_engine
+    _worker_spline = PPoly(coefficients, breakpoints)
+    _worker_engine = HighwayIndex(_worker_spline) if engine == "kd_tree" else engine
 
-def find_minimum_distance(spline_est, full_point):
+
+def _worker_signed_distance(points):
+    return _signed_distance_column(points, _worker_spline, _worker_engine)
+
+
+def find_minimum_distance(spline_est, full_point, highway_index=None):
     """
     Returns x, y, distance of closest point on a highway.
+
+    If highway_index (HighwayIndex of spline_est) is given it is queried instead of
+    running scipy minimize.
     """
     point = (full_point[0], full_point[1])
+    if highway_index is not None:
+        foot_x, foot_y, distance, _ = highway_index.query([point])
+        return float(foot_x[0]), float(foot_y[0]), abs(float(distance[0]))
     new_min = minimize(updated_distance_fxn(spline_est, point), point[0])
     all_guesses = new_min.x
     if len(all_guesses) == 0:
@@ -84,15 +174,343 @@ def create_third_dimension(spline, point):
     return signed_RHS_LHS_spline(point, spline, x, y, min_dist)
 
 
+### Batch signed distance
+# Rows of (points x segments) solved per chunk, keeps eigenvalue stacks small
+_ROWS_PER_CHUNK = 1 << 16
+
+
+def batch_signed_distance(data, highway_spline):
+    """
+    Signed distance of every point to the highway, solved in closed form.
+
+    For each point and each spline segment the derivative of the squared distance is a
+    quintic in the segment offset, its roots (and the segment ends) are the only
+    candidates for the nearest highway point. The first and last segments are extended
+    the same way CubicSpline extrapolates.
+
+    Parameters:
+    * data (numpy array) : array of at least x, y per row
+    * highway_spline (CubicSpline) : cubic spline representation of highway
+
+    Returns:
+        Tuple (signed_distance, foot_x, foot_y) of numpy arrays, one value per point.
+    """
+    points = np.asarray(data, dtype=float)[:, :2]
+    n_segments = len(highway_spline.x) - 1
+    foot_x, foot_y, distance, _ = closest_on_segments(
+        points, highway_spline, np.broadcast_to(np.arange(n_segments), (len(points), n_segments))
+    )
+    return signed_distance(points, highway_spline.derivative(), foot_x, foot_y, distance), foot_x, foot_y
+
+
+def signed_distance(points, spline_derivative, foot_x, foot_y, distance):
+    """
+    Vectorized signed_RHS_LHS_spline, sign of the cross product of highway direction
+    with the vector from the highway point to each point.
+
+    Parameters:
+    * points (numpy array) : (n, 2) array of x, y
+    * spline_derivative (PPoly) : derivative of highway spline
+    * foot_x, foot_y (numpy array) : closest highway point of each point
+    * distance (numpy array) : unsigned distance of each point
+
+    Returns:
+        Distance array, negative on the LHS of the highway.
+    """
+    cross_product = (points[:, 1] - foot_y) - spline_derivative(foot_x) * (points[:, 0] - foot_x)
+    return np.where(cross_product > 0, distance, -distance)
+
+
+def closest_on_segments(points, spline, segment_ids):
+    """
+    Finds the closest point of each point over a chosen set of spline segments.
+
+    Parameters:
+    * points (numpy array) : (n, 2) array of x, y
+    * spline (CubicSpline) : cubic spline representation of highway
+    * segment_ids (numpy array) : (n, s) segment indexes to search for each point
+
+    Returns:
+        Tuple (foot_x, foot_y, distance, segment_id) of numpy arrays, one value per point.
+    """
+    segment_ids = np.asarray(segment_ids)
+    n = len(points)
+    foot_x, foot_y = np.empty(n), np.empty(n)
+    distance, best_segment = np.empty(n), np.empty(n, dtype=np.intp)
+    chunk = max(1, _ROWS_PER_CHUNK // max(1, segment_ids.shape[1]))
+    for start in range(0, n, chunk):
+        stop = min(start + chunk, n)
+        out = _closest_on_segments_chunk(points[start:stop], spline, segment_ids[start:stop])
+        foot_x[start:stop], foot_y[start:stop], distance[start:stop], best_segment[start:stop] = out
+    return foot_x, foot_y, distance, best_segment
+
+
+def _closest_on_segments_chunk(points, spline, segment_ids):
+    last_segment = len(spline.x) - 2
+    breakpoints = spline.x[segment_ids]
+    width = spline.x[segment_ids + 1] - breakpoints
+    a, b, c, d = spline.c[:, segment_ids]
+    px = points[:, 0, np.newaxis]
+    d_shift = d - points[:, 1, np.newaxis]
+    x_shift = breakpoints - px
+
+    # 1/2 d/dt of (t + x_shift)^2 + (p(t) - py)^2, highest power first
+    quintic = np.stack(
+        (
+            3 * a * a,
+            5 * a * b,
+            4 * a * c + 2 * b * b,
+            3 * b * c + 3 * a * d_shift,
+            c * c + 2 * b * d_shift + 1,
+            c * d_shift + x_shift,
+        ),
+        axis=-1,
+    )
+    roots = np.full(quintic.shape[:-1] + (5,), np.nan)
+    solve = _may_contain_closest(segment_ids, a, b, c, d_shift, x_shift, width, last_segment)
+    roots[solve] = _polynomial_roots(quintic[solve])
+
+    # Outer segments extrapolate, as CubicSpline does
+    low = np.where(segment_ids == 0, -np.inf, 0)[..., np.newaxis]
+    high = np.where(segment_ids == last_segment, np.inf, width)[..., np.newaxis]
+    roots = np.clip(np.nan_to_num(roots, nan=0.0), low, high)
+    offsets = np.concatenate((roots, np.zeros_like(width)[..., np.newaxis], width[..., np.newaxis]), axis=-1)
+
+    with np.errstate(over="ignore", invalid="ignore"):
+        y = ((a[..., np.newaxis] * offsets + b[..., np.newaxis]) * offsets + c[..., np.newaxis]) * offsets
+        squared = (offsets + x_shift[..., np.newaxis]) ** 2 + (y + d_shift[..., np.newaxis]) ** 2
+    squared = np.where(np.isfinite(squared), squared, np.inf)
+
+    # best candidate within each segment, then best segment
+    rows = np.arange(len(points))
+    flat = squared.reshape(len(points), -1).argmin(axis=1)
+    segment_column, candidate = np.divmod(flat, offsets.shape[-1])
+    t = offsets[rows, segment_column, candidate]
+    foot_x = breakpoints[rows, segment_column] + t
+    foot_y = y[rows, segment_column, candidate] + d[rows, segment_column]
+    distance = np.sqrt(squared[rows, segment_column, candidate])
+    return foot_x, foot_y, distance, segment_ids[rows, segment_column]
+
+
+def _may_contain_closest(segment_ids, a, b, c, d_shift, x_shift, width, last_segment):
+    """
+    Segments worth solving, those whose bounding box is no further than the closest
+    segment end. Repeated segments of a point are only solved once.
+    """
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        # turning points of each segment (stable quadratic formula), clipped into the segment
+        quad_b = 2 * b
+        q = -(quad_b + np.copysign(np.sqrt(quad_b * quad_b - 12 * a * c), quad_b)) / 2
+        turns = np.stack((np.zeros_like(width), width, q / (3 * a), c / q), axis=-1)
+        turns = np.clip(np.nan_to_num(turns, nan=0.0), 0, width[..., np.newaxis])
+        y = ((a[..., np.newaxis] * turns + b[..., np.newaxis]) * turns + c[..., np.newaxis]) * turns
+        y += d_shift[..., np.newaxis]
+    ends = (turns[..., :2] + x_shift[..., np.newaxis]) ** 2 + y[..., :2] ** 2
+    closest_end = ends.min(axis=(-2, -1))[..., np.newaxis]
+
+    # outer segments extrapolate, their boxes are open towards the end of the highway
+    first, last = segment_ids == 0, segment_ids == last_segment
+    x_gap = np.maximum(np.where(first, 0, x_shift), np.where(last, 0, -width - x_shift))
+    y_gap = np.maximum(np.maximum(y.min(axis=-1), -y.max(axis=-1)), 0)
+    y_gap = np.where(first | last, 0, y_gap)
+    solve = np.maximum(x_gap, 0) ** 2 + y_gap**2 <= closest_end * (1 + 1e-9)
+
+    order = np.argsort(segment_ids, axis=-1, kind="stable")
+    ordered = np.take_along_axis(segment_ids, order, axis=-1)
+    repeated = np.zeros_like(solve)
+    np.put_along_axis(repeated, order[..., 1:], ordered[..., 1:] == ordered[..., :-1], axis=-1)
+    return solve & ~repeated
+
+
+# points whose ball query segments are solved together, padded to the largest count
+_POINTS_PER_REFINE = 1024
+
+
+class HighwayIndex:
+    """
+    Nearest highway point lookup for large numbers of points.
+
+    The spline is sampled densely once and the samples are stored in a cKDTree. A query
+    first solves the closest point problem (see closest_on_segments) on the segments
+    touching the k nearest samples of each point, which bounds its distance D. Every
+    highway point within D lies within half a sample gap of some sample, so the segments
+    of all samples within D + max_gap are then solved, giving the same answer as
+    batch_signed_distance while only searching segments near each point.
+
+    Parameters:
+    * spline (CubicSpline) : cubic spline representation of highway
+    * samples_per_segment (int) : samples taken along each spline segment
+    """
+
+    def __init__(self, spline, samples_per_segment=16):
+        self.spline = spline
+        self.derivative = spline.derivative()
+        breakpoints, widths = spline.x, np.diff(spline.x)
+
+        # samples per segment follow curve length so tight bends are not undersampled
+        fine = breakpoints[:-1, np.newaxis] + widths[:, np.newaxis] * np.linspace(0, 1, 9)
+        lengths = np.hypot(np.diff(fine, axis=1), np.diff(spline(fine), axis=1)).sum(axis=1)
+        counts = np.ceil(samples_per_segment * lengths / np.median(lengths)).astype(int)
+        counts = np.maximum(counts, 1)
+        starts = np.cumsum(counts) - counts
+        owner = np.repeat(np.arange(len(counts)), counts)
+        fraction = (np.arange(counts.sum()) - starts[owner]) / counts[owner]
+        sample_x = np.append(breakpoints[owner] + widths[owner] * fraction, breakpoints[-1])
+        self.tree = cKDTree(np.column_stack((sample_x, spline(sample_x))))
+
+        # longest arc between neighbouring samples, from a finer polyline (slightly short,
+        # the query radius adds a whole gap where half would do)
+        between = sample_x[:-1, np.newaxis] + np.diff(sample_x)[:, np.newaxis] * np.linspace(0, 1, 9)
+        self.max_gap = np.hypot(np.diff(between, axis=1), np.diff(spline(between), axis=1)).sum(axis=1).max()
+
+        # segments on either side of each sample, they differ only at breakpoints
+        right = np.append(owner, len(widths) - 1)
+        left = right.copy()
+        left[starts[1:]] -= 1
+        self.sample_segments = np.column_stack((left, right))
+
+    def query(self, points, k=2):
+        """
+        Closest highway point of every point.
+
+        Parameters:
+        * points (numpy array) : array of at least x, y per row
+        * k (int) : nearest samples whose segments are searched
+
+        Returns:
+            Tuple (foot_x, foot_y, signed_distance, segment_id) of numpy arrays, one value per point.
+        """
+        points = np.asarray(points, dtype=float)[:, :2]
+        k = min(k, self.tree.n)
+        _, nearest = self.tree.query(points, k=k)
+        segment_ids = self.sample_segments[nearest.reshape(len(points), k)].reshape(len(points), -1)
+        # extrapolated outer segments are not sampled, they are pruned by x alone
+        outer = np.broadcast_to((0, len(self.spline.x) - 2), (len(points), 2))
+        segment_ids = np.concatenate((segment_ids, outer), axis=1)
+        foot_x, foot_y, distance, segment_id = closest_on_segments(points, self.spline, segment_ids)
+
+        # every segment that can hold a closer point, as unique (point, segment) codes
+        balls = self.tree.query_ball_point(points, distance * (1 + 1e-9) + self.max_gap)
+        counts = np.fromiter(map(len, balls), dtype=np.intp, count=len(points))
+        samples = np.fromiter(itertools.chain.from_iterable(balls), dtype=np.intp, count=counts.sum())
+        n_segments = len(self.spline.x) - 1
+        owners = np.repeat(np.arange(len(points)), counts)
+        codes = np.unique(np.concatenate((
+            owners * n_segments + self.sample_segments[samples, 0],
+            owners * n_segments + self.sample_segments[samples, 1],
+        )))
+        code_rows, code_segments = np.divmod(codes, n_segments)
+        sizes = np.bincount(code_rows, minlength=len(points))
+        first = np.cumsum(sizes) - sizes
+
+        # points grouped by how many segments they need, padded with the outer segments
+        order = np.argsort(sizes, kind="stable")
+        for start in range(0, len(order), _POINTS_PER_REFINE):
+            rows = order[start:start + _POINTS_PER_REFINE]
+            width = sizes[rows[-1]]
+            if width == 0:
+                continue
+            refine_ids = np.zeros((len(rows), width + 2), dtype=np.intp)
+            refine_ids[:, 1] = n_segments - 1
+            column = np.arange(width)
+            valid = column < sizes[rows, np.newaxis]
+            picked = np.minimum(first[rows, np.newaxis] + column, len(codes) - 1)
+            refine_ids[:, 2:] = np.where(valid, code_segments[picked], 0)
+            refined = closest_on_segments(points[rows], self.spline, refine_ids)
+            foot_x[rows], foot_y[rows], distance[rows], segment_id[rows] = refined
+        return foot_x, foot_y, signed_distance(points, self.derivative, foot_x, foot_y, distance), segment_id
+
+
+def _polynomial_roots(coefficients):
+    """
+    Roots of many polynomials at once from companion matrix eigenvalues.
+
+    Parameters:
+    * coefficients (numpy array) : (N, degree + 1) coefficients, highest power first
+
+    Returns:
+        (N, degree) array of the real part of each root, nan where the degree is lower.
+    """
+    n_rows, n_coeff = coefficients.shape
+    degree = n_coeff - 1
+    roots = np.full((n_rows, degree), np.nan)
+    scale = np.abs(coefficients).max(axis=1)
+    nonzero = np.abs(coefficients) > 1e-12 * scale[:, np.newaxis]
+    # first significant coefficient of each row, rows of all zeros have no roots
+    leading = np.where(nonzero.any(axis=1), nonzero.argmax(axis=1), degree)
+    for lead in range(degree):
+        rows = np.flatnonzero(leading == lead)
+        if len(rows) == 0:
+            continue
+        size = degree - lead
+        monic = coefficients[rows, lead + 1:] / coefficients[rows, lead, np.newaxis]
+        companion = np.zeros((len(rows), size, size))
+        companion[:, 0, :] = -monic
+        companion[:, np.arange(1, size), np.arange(size - 1)] = 1
+        roots[rows, :size] = np.linalg.eigvals(companion).real
+    return roots
+
+
 def retrieve_hotel_data(file_name):
     """ Reads txt file that contains hotel data.
         Assumes in columns of Name, X location, Y location, and Rating."""
-    file = open(file_name, "r")
-    file.readline()
-    data = []
-    for line in file.readlines():
-        data.append(np.array([float(d) for d in line.split()[1:4]]))
-    return np.array(data)
+    hotels = load_hotels(file_name)
+    return np.column_stack((hotels["lng"], hotels["lat"], hotels["rating"]))
+
+
+# columns of hotel files written by scrape_google_maps.collect_hotels_along_highway
+HOTEL_COLUMNS = ("name", "lng", "lat", "rating", "reviews")
+
+
+def load_hotels(file_name):
+    """
+    Reads a whole hotel txt file in one parse.
+
+    Parameters:
+    * file_name (str) : hotel file with a header line, then Name, Long, Lat, Rating,
+        Number_Of_Reviews separated by whitespace
+
+    Returns:
+        Dictionary of column name : numpy array, names as str, reviews as int64
+        and the rest float64.
+    """
+    with open(file_name, "r", encoding="utf-8") as file:
+        file.readline()
+        return _parse_hotel_rows(file.read())
+
+
+def iter_hotels(file_name, chunk_rows=100_000):
+    """
+    Reads a hotel txt file in blocks of rows, never holding the whole file.
+
+    Parameters:
+    * file_name (str) : hotel file, see load_hotels
+    * chunk_rows (int) : rows per block, the last block may be shorter
+
+    Yields:
+        Dictionary of column name : numpy array for each block, see load_hotels.
+    """
+    with open(file_name, "r", encoding="utf-8") as file:
+        file.readline()
+        while True:
+            block = "".join(itertools.islice(file, chunk_rows))
+            if not block:
+                return
+            yield _parse_hotel_rows(block)
+
+
+def _parse_hotel_rows(text):
+    fields = np.array(text.split())
+    if len(fields) % len(HOTEL_COLUMNS):
+        raise ValueError(f"Hotel rows must have {len(HOTEL_COLUMNS)} whitespace separated fields")
+    fields = fields.reshape(-1, len(HOTEL_COLUMNS))
+    return {
+        "name": fields[:, 0],
+        "lng": fields[:, 1].astype(np.float64),
+        "lat": fields[:, 2].astype(np.float64),
+        "rating": fields[:, 3].astype(np.float64),
+        "reviews": fields[:, 4].astype(np.float64).astype(np.int64),
+    }
 
 
 def create_cubic_splines(snapped_path):
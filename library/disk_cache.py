@@ -0,0 +1,118 @@
+"""
+disk_cache.py
+Created by Camila Pierce
+Last Updated 10.17.2026
+
+Content-addressed on-disk cache of numpy arrays. Each entry is a directory of .npy files
+named by a hash of the inputs that produced it, so unchanged inputs load the saved arrays
+(memory-mapped) instead of recomputing them. Least recently used entries are removed once
+the cache grows past its size limit.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import numpy as np
+
+
+class DiskCache:
+    """
+    Size-bounded LRU cache of named numpy arrays under a directory.
+
+    Parameters:
+    * directory (str) : folder holding cache entries, created if missing
+    * max_bytes (int) : total size of entries kept before least recently used are evicted
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024**2):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(*arrays, **params):
+        """
+        Hash of array contents (with dtype and shape) and any extra parameters.
+
+        Returns:
+            Hex digest string used as entry name.
+        """
+        digest = hashlib.sha256()
+        for array in arrays:
+            array = np.ascontiguousarray(array)
+            digest.update(f"{array.dtype.str}{array.shape}".encode())
+            digest.update(array.tobytes())
+        digest.update(repr(sorted(params.items())).encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def load(self, key, mmap_mode="r"):
+        """
+        Returns dictionary of name : array for the entry, or None if not cached.
+        Arrays are memory-mapped unless mmap_mode is None.
+        """
+        path = self._path(key)
+        if not os.path.isdir(path):
+            return None
+        try:
+            arrays = {
+                file_name[: -len(".npy")]: np.load(os.path.join(path, file_name), mmap_mode=mmap_mode)
+                for file_name in os.listdir(path)
+                if file_name.endswith(".npy")
+            }
+            os.utime(path)  # marks entry as recently used
+        except OSError:  # evicted by another process sharing the cache
+            return None
+        return arrays
+
+    def store(self, key, **arrays):
+        """
+        Saves named arrays under key, then evicts old entries past max_bytes.
+        """
+        temp_path = tempfile.mkdtemp(dir=self.directory, prefix=".tmp")
+        for name, array in arrays.items():
+            np.save(os.path.join(temp_path, f"{name}.npy"), np.asarray(array))
+        try:
+            os.replace(temp_path, self._path(key))
+        except OSError:  # entry written by someone else in the meantime
+            shutil.rmtree(temp_path, ignore_errors=True)
+        self.evict()
+
+    def invalidate(self, key=None):
+        """
+        Removes entry with given key, or every entry if key is None.
+        """
+        keys = self.entries() if key is None else [key]
+        for entry in keys:
+            shutil.rmtree(self._path(entry), ignore_errors=True)
+
+    def entries(self):
+        """
+        Returns list of cached keys.
+        """
+        return [
+            entry
+            for entry in os.listdir(self.directory)
+            if not entry.startswith(".") and os.path.isdir(self._path(entry))
+        ]
+
+    def evict(self):
+        """
+        Removes least recently used entries until total size is within max_bytes.
+        """
+        sizes, used = {}, {}
+        for entry in self.entries():
+            path = self._path(entry)
+            try:
+                sizes[entry] = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+                used[entry] = os.path.getmtime(path)
+            except OSError:  # removed by another process sharing the cache
+                sizes.pop(entry, None)
+        total = sum(sizes.values())
+        for entry in sorted(used, key=used.get):
+            if total <= self.max_bytes:
+                break
+            self.invalidate(entry)
+            total -= sizes[entry]
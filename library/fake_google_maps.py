@@ -0,0 +1,237 @@
+"""
+fake_google_maps.py
+Created by Camila Pierce
+Last Updated 10.17.2026
+
+Local stand-in for the Google Maps client, for measuring and testing the scraper without
+using quota. It serves snap_to_roads, places and distance_matrix in the shape
+scrape_google_maps reads, from a synthetic road with synthetic hotels along it. Every call
+waits a configurable latency, can fail at a configurable rate and is held to a queries per
+second limit. Failed and rate limited calls are retried with backoff as googlemaps.Client
+does, and counted.
+
+Pass an instance wherever scrape_google_maps takes a client.
+"""
+import threading
+import time
+from collections import deque
+import numpy as np
+from googlemaps.exceptions import ApiError, HTTPError
+from library.scrape_google_maps import haversine_miles
+
+MILES_PER_DEGREE = 69.0
+METERS_PER_MILE = 1609.34
+
+# API limits the fake enforces
+MAX_PATH_POINTS = 100
+MAX_LOCATIONS = 25
+MAX_ELEMENTS = 100
+PAGE_SIZE = 20
+MAX_RESULTS = 60
+
+
+class FakeGoogleMaps:
+    """
+    Synthetic road and hotels behind the googlemaps.Client methods used by the scraper.
+
+    Parameters:
+    * length_miles (float) : road length, the road runs east from start with gentle curves
+    * start (tuple) : (lat, long) of the west end of the road
+    * spacing_miles (float) : distance between road points returned by interpolation
+    * hotels_per_mile (float) : number of hotels placed along the road per mile
+    * spread_miles (float) : standard deviation of each hotel's offset from the road
+    * search_miles (float) : places returns hotels up to this far from the location
+    * detour (float) : driving distance is straight line distance times detour
+    * latency (float or dict) : seconds per call, or endpoint : seconds
+    * jitter (float) : latency varies uniformly by this fraction
+    * error_rate (float) : probability a call fails with HTTP 503
+    * queries_per_second (float) : calls allowed per second, more are rate limited,
+        None for no limit
+    * token_delay (float) : seconds before a next_page_token is accepted
+    * retry (bool) : retry failed calls with backoff, as googlemaps.Client, instead of raising
+    * backoff (float) : first retry delay in seconds, grows 1.5 times per retry
+    * random_state (int) : seed of the road, hotels, latency and errors
+    """
+
+    def __init__(self, length_miles=20, start=(35.8, -78.7), spacing_miles=0.25, hotels_per_mile=6,
+                 spread_miles=1.5, search_miles=5, detour=1.3, latency=0.05, jitter=0.2,
+                 error_rate=0.0, queries_per_second=None, token_delay=0.0, retry=True, backoff=0.5,
+                 random_state=0):
+        self.search_miles = search_miles
+        self.detour = detour
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.queries_per_second = queries_per_second
+        self.token_delay = token_delay
+        self.retry = retry
+        self.backoff = backoff
+        self._rng = np.random.default_rng(random_state)
+        self._lock = threading.Lock()
+        self._recent = deque()
+        self._pages = {}
+        self.calls = {"snap_to_roads": 0, "places": 0, "distance_matrix": 0}
+        self.errors = 0
+        self.rate_limited = 0
+
+        # road sampled every spacing_miles, eastward with a slow north-south wave
+        miles = np.arange(0, length_miles + spacing_miles / 2, spacing_miles)
+        lat = start[0] + 0.02 * np.sin(miles / 3)
+        lng = start[1] + miles / (MILES_PER_DEGREE * np.cos(np.radians(start[0])))
+        self.road = np.column_stack((lat, lng))
+
+        n_hotels = int(round(hotels_per_mile * length_miles))
+        anchors = self.road[self._rng.integers(0, len(self.road), n_hotels)]
+        offsets = self._rng.normal(0, spread_miles, (n_hotels, 2)) / MILES_PER_DEGREE
+        offsets[:, 1] /= np.cos(np.radians(anchors[:, 0]))
+        self.hotels = anchors + offsets
+        self.hotel_ratings = np.round(self._rng.uniform(2.5, 5, n_hotels), 1)
+        self.hotel_reviews = self._rng.poisson(300, n_hotels)
+
+    def road_miles(self):
+        """
+        Length of the synthetic road in miles.
+        """
+        return float(_miles(self.road[:-1], self.road[1:]).sum())
+
+    def waypoints(self, count=8):
+        """
+        count evenly spaced (lat, long) road points, as hand picked input for scraping_script.
+        """
+        rows = np.linspace(0, len(self.road) - 1, count).round().astype(int)
+        return [tuple(point) for point in self.road[rows].tolist()]
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    ### Endpoints
+
+    def snap_to_roads(self, path, interpolate=False):
+        self._request("snap_to_roads")
+        if len(path) > MAX_PATH_POINTS:
+            raise ApiError("INVALID_ARGUMENT", f"at most {MAX_PATH_POINTS} path points")
+        points = np.array([_lat_lng(point) for point in path], dtype=float)
+        snapped = _miles(points[:, np.newaxis], self.road).argmin(axis=1)
+        if interpolate:
+            rows = [snapped[0]]
+            for low, high in zip(snapped[:-1], snapped[1:]):
+                step = 1 if high >= low else -1
+                rows.extend(range(low + step, high + step, step))
+            snapped = rows
+        return [
+            {"location": {"latitude": lat, "longitude": lng}, "placeId": f"road-{row}"}
+            for row, (lat, lng) in zip(snapped, self.road[snapped].tolist())
+        ]
+
+    def places(self, query=None, location=None, radius=None, page_token=None, **params):
+        self._request("places")
+        if page_token is not None:
+            with self._lock:
+                if page_token not in self._pages:
+                    raise ApiError("INVALID_REQUEST", "unknown page token")
+                issued, remaining = self._pages[page_token]
+                if time.perf_counter() - issued < self.token_delay:
+                    raise ApiError("INVALID_REQUEST", "page token not yet valid")
+                del self._pages[page_token]
+            return self._page(remaining)
+        distances = _miles(np.array(_lat_lng(location)), self.hotels)
+        found = np.flatnonzero(distances <= self.search_miles)
+        found = found[np.argsort(distances[found], kind="stable")][:MAX_RESULTS]
+        return self._page(found)
+
+    def distance_matrix(self, origins, destinations, mode=None, units=None, **params):
+        self._request("distance_matrix")
+        origins = np.array([_lat_lng(point) for point in _as_list(origins)], dtype=float)
+        destinations = np.array([_lat_lng(point) for point in _as_list(destinations)], dtype=float)
+        if len(origins) > MAX_LOCATIONS or len(destinations) > MAX_LOCATIONS:
+            raise ApiError("MAX_DIMENSIONS_EXCEEDED")
+        if len(origins) * len(destinations) > MAX_ELEMENTS:
+            raise ApiError("MAX_ELEMENTS_EXCEEDED")
+        meters = _miles(origins[:, np.newaxis], destinations) * self.detour * METERS_PER_MILE
+        return {
+            "status": "OK",
+            "rows": [
+                {
+                    "elements": [
+                        {
+                            "status": "OK",
+                            "distance": {"value": int(value), "text": f"{value / METERS_PER_MILE:.1f} mi"},
+                            "duration": {"value": int(value / 25)},
+                        }
+                        for value in row
+                    ]
+                }
+                for row in meters.tolist()
+            ],
+        }
+
+    ### Simulated transport
+
+    def _page(self, hotels):
+        page, remaining = hotels[:PAGE_SIZE], hotels[PAGE_SIZE:]
+        response = {
+            "status": "OK",
+            "results": [
+                {
+                    "name": f"Synthetic Hotel {index}",
+                    "place_id": f"fake-hotel-{index}",
+                    "geometry": {"location": {"lat": lat, "lng": lng}},
+                    "rating": float(self.hotel_ratings[index]),
+                    "user_ratings_total": int(self.hotel_reviews[index]),
+                }
+                for index, (lat, lng) in zip(page.tolist(), self.hotels[page].tolist())
+            ],
+        }
+        if len(remaining):
+            with self._lock:
+                token = f"page-{len(self._pages)}-{self._rng.integers(1 << 62)}"
+                self._pages[token] = (time.perf_counter(), remaining)
+            response["next_page_token"] = token
+        return response
+
+    def _request(self, endpoint):
+        """
+        Waits one round trip, retrying transient failures and rate limits like the real client.
+        """
+        retries = 0
+        while True:
+            with self._lock:
+                self.calls[endpoint] += 1
+                now = time.perf_counter()
+                while self._recent and now - self._recent[0] > 1:
+                    self._recent.popleft()
+                limited = self.queries_per_second is not None and len(self._recent) >= self.queries_per_second
+                if not limited:
+                    self._recent.append(now)
+                failed = not limited and self._rng.random() < self.error_rate
+                latency = self.latency[endpoint] if isinstance(self.latency, dict) else self.latency
+                latency *= 1 + self.jitter * (2 * self._rng.random() - 1)
+                self.rate_limited += limited
+                self.errors += failed
+            time.sleep(latency)
+            if not (limited or failed):
+                return
+            if not self.retry:
+                raise ApiError("OVER_QUERY_LIMIT") if limited else HTTPError(503)
+            time.sleep(self.backoff * 1.5 ** retries)
+            retries += 1
+
+
+def _miles(a, b):
+    # haversine between (..., 2) latitude, longitude arrays
+    return haversine_miles(a[..., 0], a[..., 1], b[..., 0], b[..., 1])
+
+
+def _lat_lng(point):
+    if isinstance(point, dict):
+        if "lat" in point:
+            return point["lat"], point["lng"]
+        return point["latitude"], point["longitude"]
+    return tuple(point)
+
+
+def _as_list(points):
+    # a single location may be passed instead of a list, as googlemaps allows
+    if isinstance(points, dict) or (len(points) == 2 and np.isscalar(points[0])):
+        return [points]
+    return points
@@ -0,0 +1,105 @@
+"""
+kmeans_cache.py
+Created by Camila Pierce
+Last Updated 10.17.2026
+
+Memoized k-means fits. A fit is stored on disk under a hash of the data it was run on and
+its settings (k, beta method and value, init, random_state and the scikit-learn version),
+so rerunning a script after changing only the plotting loads every clustering instead of
+fitting it again. Labels are stored in the smallest integer type holding k.
+"""
+import numpy as np
+import sklearn
+from sklearn.cluster import KMeans
+from library.disk_cache import DiskCache
+from library.sweep_kmeans import KMeansFit
+
+
+class KMeansCache:
+    """
+    Size-bounded on-disk cache of KMeans results, see disk_cache.DiskCache.
+
+    Parameters:
+    * directory (str) : folder holding cached fits, created if missing
+    * max_bytes (int) : total size kept before least recently used fits are evicted
+    """
+
+    def __init__(self, directory="cache/kmeans", max_bytes=256 * 1024**2):
+        self.disk_cache = DiskCache(directory, max_bytes)
+
+    def key(self, data, k, init="k-means++", random_state=None, method=None, beta=None, repeat=0):
+        """
+        Hash of data and every setting that changes the fit.
+
+        Parameters:
+        * data (numpy array) : data the fit runs on (after any beta modification)
+        * k (int) : number of clusters
+        * init (str or numpy array) : KMeans init, arrays are hashed by content
+        * random_state (int) : KMeans random_state
+        * method (str) : beta method the data was modified with, if any
+        * beta (float) : beta value the data was modified with, if any
+        * repeat (int) : tells apart repeated runs that are meant to differ, such as
+            unseeded runs of temp_variability_demo
+
+        Returns:
+            Hex digest string
+        """
+        arrays = [np.asarray(data, dtype=float)]
+        if not isinstance(init, str):
+            arrays.append(np.asarray(init, dtype=float))
+            init = "array"
+        return self.disk_cache.key(
+            *arrays, k=k, init=init, random_state=random_state, method=method,
+            beta=None if beta is None else float(beta), repeat=repeat,
+            sklearn=sklearn.__version__,
+        )
+
+    def load(self, key):
+        """
+        Returns cached KMeansFit for key, or None.
+        """
+        arrays = self.disk_cache.load(key, mmap_mode=None)
+        if arrays is None:
+            return None
+        return KMeansFit(
+            arrays["labels"].astype(np.int32),
+            arrays["centers"],
+            float(arrays["inertia"]),
+            int(arrays["n_iter"]),
+        )
+
+    def store(self, key, fit):
+        """
+        Saves labels, centers, inertia and number of iterations of a fitted KMeans or KMeansFit.
+        """
+        k = len(fit.cluster_centers_)
+        dtype = np.uint8 if k <= 1 << 8 else np.uint16 if k <= 1 << 16 else np.int32
+        self.disk_cache.store(
+            key,
+            labels=np.asarray(fit.labels_).astype(dtype),
+            centers=np.asarray(fit.cluster_centers_, dtype=float),
+            inertia=np.float64(fit.inertia_),
+            n_iter=np.int64(fit.n_iter_),
+        )
+
+    def fit(self, data, k, init="k-means++", random_state=None, method=None, beta=None, repeat=0):
+        """
+        KMeans(n_clusters=k, init=init, random_state=random_state).fit(data), loaded from
+        the cache when the same fit was already run. See key for parameters.
+
+        Returns:
+            KMeansFit
+        """
+        key = self.key(data, k, init, random_state, method, beta, repeat)
+        fit = self.load(key)
+        if fit is None:
+            kmeans = KMeans(n_clusters=k, init=init, random_state=random_state).fit(data)
+            fit = KMeansFit(kmeans.labels_, kmeans.cluster_centers_, kmeans.inertia_, kmeans.n_iter_)
+            self.store(key, fit)
+        return fit
+
+    def clear(self):
+        """
+        Removes every cached fit.
+        """
+        self.disk_cache.invalidate()
@@ -0,0 +1,151 @@
+"""
+maps_cache.py
+Created by Camila Pierce
+Last Updated 10.17.2026
+
+Google Maps client wrapper that keeps responses in a SQLite file. Responses are stored by
+endpoint and normalized parameters, expire after a per-endpoint time to live, and the least
+recently used are removed past a size limit. Reruns of scraping_script.py then read
+snap_to_roads, places and distance_matrix results from disk instead of the API. In
+offline mode nothing is requested at all: calls not in the cache raise LookupError.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from library import scrape_google_maps
+
+DAY = 24 * 60 * 60
+
+# seconds a response stays valid, roads change rarely, places more often
+DEFAULT_TTL = {
+    "snap_to_roads": 90 * DAY,
+    "places": 7 * DAY,
+    "distance_matrix": 30 * DAY,
+}
+
+
+class CachingClient:
+    """
+    Drop-in replacement for the googlemaps.Client methods used by scrape_google_maps.
+
+    Parameters:
+    * client (googlemaps.Client) : client used on cache misses, defaults to
+        scrape_google_maps.gmap, never used when offline
+    * path (str) : SQLite file, created if missing
+    * ttl (dict) : endpoint : seconds, overrides DEFAULT_TTL, None never expires
+    * max_bytes (int) : total size of stored responses kept before least recently used
+        are evicted
+    * offline (bool) : only serve from the cache
+
+    hits and misses count the calls answered from the cache and from the client.
+    """
+
+    def __init__(self, client=None, path="cache/google_maps.sqlite", ttl=None, max_bytes=64 * 1024**2,
+                 offline=False):
+        self.client = client
+        self.ttl = {**DEFAULT_TTL, **(ttl or {})}
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # one connection shared by scraping threads, guarded by a lock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, endpoint TEXT, "
+            "response TEXT, size INTEGER, created REAL, used REAL)"
+        )
+        self._connection.commit()
+
+    def snap_to_roads(self, path, interpolate=False):
+        return self._call("snap_to_roads", path=path, interpolate=interpolate)
+
+    def places(self, query=None, location=None, radius=None, page_token=None, **params):
+        return self._call("places", query=query, location=location, radius=radius,
+                          page_token=page_token, **params)
+
+    def distance_matrix(self, origins, destinations, mode=None, units=None, **params):
+        return self._call("distance_matrix", origins=origins, destinations=destinations, mode=mode,
+                          units=units, **params)
+
+    def _call(self, endpoint, **params):
+        key = endpoint + json.dumps(normalize(params), sort_keys=True)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            ttl = self.ttl.get(endpoint)
+            if row is not None and (ttl is None or self.offline or now - row[1] <= ttl):
+                self._connection.execute("UPDATE responses SET used = ? WHERE key = ?", (now, key))
+                self._connection.commit()
+                self.hits += 1
+                return json.loads(row[0])
+        if self.offline:
+            raise LookupError(f"{endpoint} response not cached (offline): {key}")
+
+        response = getattr(self._client(), endpoint)(**params)
+        text = json.dumps(response)
+        with self._lock:
+            self.misses += 1
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, text, len(text), now, now),
+            )
+            self._evict()
+            self._connection.commit()
+        return response
+
+    def _client(self):
+        if self.client is None:
+            self.client = scrape_google_maps.gmap
+        return self.client
+
+    def _evict(self):
+        total = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._connection.execute("SELECT key, size FROM responses ORDER BY used").fetchall():
+            self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def purge_expired(self):
+        """
+        Removes responses older than their endpoint's time to live.
+        """
+        now = time.time()
+        with self._lock:
+            for endpoint, ttl in self.ttl.items():
+                if ttl is not None:
+                    self._connection.execute(
+                        "DELETE FROM responses WHERE endpoint = ? AND created < ?", (endpoint, now - ttl)
+                    )
+            self._connection.commit()
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM responses")
+            self._connection.commit()
+
+    def close(self):
+        self._connection.close()
+
+
+def normalize(value):
+    """
+    Parameters in a canonical JSON form: tuples and numpy arrays become lists, numpy
+    numbers become Python numbers, location dictionaries keep sorted keys (json.dumps).
+    """
+    if isinstance(value, dict):
+        return {str(key): normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+    if hasattr(value, "tolist"):
+        return normalize(value.tolist())
+    return value
@@ -17,6 +17,9 @@ Need: Places, Roads, Distance Matrix, Service Usage
 Reformatted using black.
 """
 
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import numpy as np
 import googlemaps
 
@@ -33,31 +36,70 @@ def collect_hotels_along_highway(
     abbreviate=False,
     index_range=(1, 5),
     miles=3,
+    workers=1,
+    follow_pages=False,
+    client=None,
+    detour=None,
+    verbose=False,
 ):
-    """Reads txt file that contains hotel data.
-    Assumes in columns of Name, X location, Y location, and Rating.
-
-    Saves information to """
-    find_road = gmap.snap_to_roads(path, interpolate=True)
-    data = set()
-
-    for hw_point in find_road:
-        latlong = hw_point["location"]
-        result = gmap.places(query="hotels", radius=r, location=latlong)
-        # print(result)
-        for place in result[
-            "results"
-        ]:  ##place is a dictionary with several keys--name, rating, geometry:location:lat/long
-            if within_distance(latlong, place["geometry"]["location"], miles):
-                data.add(
-                    (
-                        place["name"],
-                        float(place["geometry"]["location"]["lng"]),
-                        float(place["geometry"]["location"]["lat"]),
-                        float(place["rating"]),
-                        int(place["user_ratings_total"]),
-                    )
-                )
+    """Searches for hotels around every point of the snapped highway and saves those within
+    miles driving distance to filename, in columns of Name, X location, Y location, Rating
+    and Number of Reviews.
+
+    Parameters:
+    * path (list) : (lat, long) points along highway
+    * r (int) : places search radius in meters
+    * miles (float) : maximum driving distance from highway
+    * workers (int) : searches and distance requests sent at once in a thread pool
+    * follow_pages (bool) : also read the next pages (next_page_token) of every search,
+        up to 60 results per point instead of 20
+    * client (googlemaps.Client) : defaults to the module client gmap
+    * detour (float) : opt-in shortcut, places closer than miles / detour in a straight
+        line are kept without a driving distance, see filter_within_distance; None (default)
+        checks every place not ruled out by straight line distance
+        without a driving distance request, None checks all of them
+    * verbose (bool) : print how many places the straight line prefilter resolved
+
+    Places found from several highway points are checked once (by place_id), in batched
+    distance matrix requests, see filter_within_distance. Hotels are kept in order of the
+    highway point that first found them, so the saved file is the same for any number of
+    workers.
+    """
+    client = gmap if client is None else client
+    find_road = client.snap_to_roads(path, interpolate=True)
+    search = partial(places_near_point, r=r, follow_pages=follow_pages, client=client)
+    latlongs = [hw_point["location"] for hw_point in find_road]
+
+    if workers == 1:
+        found = [search(latlong) for latlong in latlongs]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            found = list(executor.map(search, latlongs))
+    # dictionary keeps first found order and removes places found again
+    candidates = {}
+    for places in found:
+        for place in places:
+            candidates.setdefault(_place_key(place), place)
+    candidates = list(candidates.values())
+
+    highway = [(latlong["latitude"], latlong["longitude"]) for latlong in latlongs]
+    within, stats = filter_within_distance(highway, candidates, miles, client=client, workers=workers,
+                                           detour=detour, return_stats=True)
+    if verbose:
+        print(f"{stats['accepted']} places kept and {stats['rejected']} dropped by straight line "
+              f"distance, {stats['checked']} checked by driving distance in {stats['requests']} "
+              f"requests ({stats['requests_avoided']} requests avoided)")
+    data = dict.fromkeys(
+        (
+            place["name"],
+            float(place["geometry"]["location"]["lng"]),
+            float(place["geometry"]["location"]["lat"]),
+            float(place["rating"]),
+            int(place["user_ratings_total"]),
+        )
+        for place, keep in zip(candidates, within)
+        if keep
+    )
 
 
     with open(filename, "w", encoding="utf-8") as file:
@@ -77,7 +119,203 @@ def collect_hotels_along_highway(
     return None
 
 
-def within_distance(loc_a, loc_b, mi):
+def places_near_point(latlong, r=50, follow_pages=False, client=None, page_delay=2, page_retries=5):
+    """
+    Places found by a hotel search around one highway point.
+
+    Parameters:
+    * latlong (dict) : highway point location
+    * r (int) : search radius in meters
+    * follow_pages (bool) : read every page of results through next_page_token
+    * client (googlemaps.Client) : defaults to the module client gmap
+    * page_delay (float) : seconds before asking for a next page, Google only accepts a
+        token shortly after issuing it
+    * page_retries (int) : attempts per next page while its token is not yet valid, at
+        least 1 (the first attempt is immediate)
+
+    Returns:
+        List of place dictionaries (name, rating, geometry:location:lat/lng, ...) in
+        search order
+    """
+    if page_retries < 1:
+        raise ValueError(f"page_retries must be at least 1, got {page_retries}")
+    client = gmap if client is None else client
+    places = []
+    result = client.places(query="hotels", radius=r, location=latlong)
+    while True:
+        places.extend(result["results"])
+        token = result.get("next_page_token")
+        if not follow_pages or token is None:
+            return places
+        result = _next_page(client, token, page_delay, page_retries)
+
+
+def _place_key(place):
+    if "place_id" in place:
+        return place["place_id"]
+    location = place["geometry"]["location"]
+    return place["name"], location["lat"], location["lng"]
+
+
+# Distance Matrix limits per request
+MAX_LOCATIONS = 25
+MAX_ELEMENTS = 100
+
+
+def filter_within_distance(highway, places, miles, client=None, workers=1, detour=None, return_stats=False):
+    """
+    Whether each place is within miles driving distance of the highway, checked with as
+    few distance matrix requests as possible.
+
+    Straight line (haversine) distances to every highway point are computed first, see
+    classify_by_haversine: places farther than miles from all of them cannot be within
+    and are dropped. If detour is given, places closer than miles / detour are also kept
+    without a request; this assumes no road is more than detour times longer than the
+    straight line, which is a guess, not a bound. Only the rest need a driving distance.
+    Each is paired with its nearest highway point; places sorted by that point are packed
+    into requests of up to 25 origins and 25 destinations and 100 elements, so nearby
+    places share origins. A place is within if the driving distance from its own nearest
+    highway point is within miles, whatever else shares its request.
+
+    Parameters:
+    * highway (list) : (lat, long) highway points
+    * places (list) : place dictionaries as returned by places_near_point
+    * miles (float) : maximum driving distance
+    * client (googlemaps.Client) : defaults to the module client gmap
+    * workers (int) : requests sent at once in a thread pool
+    * detour (float) : assumed largest ratio of driving to straight line distance, opt-in,
+        None (default) keeps no place without a request
+    * return_stats (bool) : also return counts of the prefilter
+
+    Returns:
+        numpy bool array, one value per place, or (array, stats) if return_stats, where
+        stats holds the numbers of places accepted, rejected and checked, the requests
+        sent, and the requests_avoided against checking every place
+    """
+    client = gmap if client is None else client
+    highway = np.asarray(highway, dtype=float).reshape(-1, 2)
+    locations = np.array(
+        [(place["geometry"]["location"]["lat"], place["geometry"]["location"]["lng"]) for place in places],
+        dtype=float,
+    ).reshape(-1, 2)
+    within = np.zeros(len(locations), dtype=bool)
+    stats = dict.fromkeys(("accepted", "rejected", "checked", "requests", "requests_avoided"), 0)
+    if len(locations):
+        nearest, inside, outside = classify_by_haversine(highway, locations, miles, detour)
+        within[inside] = True
+        ambiguous = np.flatnonzero(~inside & ~outside)
+
+        order = ambiguous[np.argsort(nearest[ambiguous], kind="stable")]
+        batches = [order[batch] for batch in _pack_requests(nearest[order])]
+        check = partial(_check_batch, highway=highway, locations=locations, nearest=nearest,
+                        meters=miles * 1609, client=client)
+        if workers == 1:
+            results = [check(batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(check, batches))
+        for batch, batch_within in zip(batches, results):
+            within[batch] = batch_within
+
+        stats.update(accepted=int(inside.sum()), rejected=int(outside.sum()), checked=len(ambiguous),
+                     requests=len(batches))
+        stats["requests_avoided"] = len(_pack_requests(np.sort(nearest))) - len(batches)
+    return (within, stats) if return_stats else within
+
+
+def classify_by_haversine(highway, locations, miles, detour=None, chunk_rows=4096):
+    """
+    Straight line test of every location against every highway point at once. Driving
+    distance is never shorter than straight line distance, so a location farther than
+    miles from every highway point is outside. Only if detour is given, a location closer
+    than miles / detour is taken as inside, assuming roads are never longer than detour
+    times the straight line.
+
+    Parameters:
+    * highway (numpy array) : (m, 2) latitude, longitude
+    * locations (numpy array) : (n, 2) latitude, longitude
+    * miles (float) : maximum driving distance
+    * detour (float) : assumed largest ratio of driving to straight line distance, None
+        (default) marks no location inside
+    * chunk_rows (int) : locations compared at a time, bounds the (rows, m) distances held
+
+    Returns:
+        (nearest, inside, outside): index of the closest highway point of each location,
+        and bool arrays
+    """
+    nearest = np.empty(len(locations), dtype=np.int64)
+    closest = np.empty(len(locations))
+    for start in range(0, len(locations), chunk_rows):
+        chunk = locations[start:start + chunk_rows]
+        distances = haversine_miles(chunk[:, np.newaxis, 0], chunk[:, np.newaxis, 1], highway[:, 0], highway[:, 1])
+        nearest[start:start + chunk_rows] = distances.argmin(axis=1)
+        closest[start:start + chunk_rows] = distances.min(axis=1)
+    outside = closest > miles
+    inside = np.zeros(len(locations), dtype=bool) if detour is None else closest * detour <= miles
+    return nearest, inside, outside
+
+
+def haversine_miles(lat_a, lng_a, lat_b, lng_b):
+    """
+    Great circle distance in miles, broadcast over numpy arrays of degrees.
+    """
+    lat_a, lng_a, lat_b, lng_b = (np.radians(value) for value in (lat_a, lng_a, lat_b, lng_b))
+    a = np.sin((lat_b - lat_a) / 2) ** 2 + np.cos(lat_a) * np.cos(lat_b) * np.sin((lng_b - lng_a) / 2) ** 2
+    return 2 * 3958.8 * np.arcsin(np.sqrt(np.minimum(a, 1)))
+
+
+def _pack_requests(sorted_nearest):
+    """
+    Splits places sorted by nearest highway point into consecutive batches whose distinct
+    origins times destinations fit one request. Returns list of index slices.
+    """
+    if len(sorted_nearest) == 0:
+        return []
+    batches, start, origins = [], 0, set()
+    for index, point in enumerate(sorted_nearest.tolist()):
+        count = index - start + 1
+        new_origins = len(origins | {point})
+        if count > MAX_LOCATIONS or new_origins > MAX_LOCATIONS or count * new_origins > MAX_ELEMENTS:
+            batches.append(slice(start, index))
+            start, origins = index, set()
+        origins.add(point)
+    batches.append(slice(start, len(sorted_nearest)))
+    return batches
+
+
+def _check_batch(batch, highway, locations, nearest, meters, client):
+    origins = np.unique(nearest[batch])
+    response = client.distance_matrix(
+        [tuple(point) for point in highway[origins].tolist()],
+        [tuple(point) for point in locations[batch].tolist()],
+        mode="driving",
+        units="imperial",
+    )
+    # elements without a route (no "distance") never count as within
+    distances = np.array(
+        [
+            [element["distance"]["value"] if "distance" in element else np.inf for element in row["elements"]]
+            for row in response["rows"]
+        ],
+        dtype=float,
+    )
+    # each place is judged from its own nearest highway point, its row among the origins
+    rows = np.searchsorted(origins, nearest[batch])
+    return distances[rows, np.arange(len(rows))] <= meters
+
+
+def _next_page(client, token, page_delay, page_retries):
+    # asks right away so cached pages return without waiting
+    for attempt in range(page_retries):
+        try:
+            return client.places(page_token=token)
+        except googlemaps.exceptions.ApiError as error:
+            if error.status != "INVALID_REQUEST" or attempt == page_retries - 1:
+                raise
+        time.sleep(page_delay)
+
+
+def within_distance(loc_a, loc_b, mi, client=None):
     """
     Returns True/False whether distance between two points is less than maximum distance.
 
@@ -85,21 +323,24 @@ def within_distance(loc_a, loc_b, mi):
     * loc_a (list) : coordinate points, latitude and longitude
     * loc_b (list) : coordinate points, latitude and longitude
     * mi (float) : number of miles from highway to restrict search
+    * client (googlemaps.Client) : defaults to the module client gmap
 
     Returns:
         Bool value of if hotel is within specificed distance from highway.
     """
+    client = gmap if client is None else client
     meters = mi * 1609
-    distance = gmap.distance_matrix(loc_a, loc_b, mode="driving", units="imperial")
+    distance = client.distance_matrix(loc_a, loc_b, mode="driving", units="imperial")
     return distance["rows"][0]["elements"][0]["distance"]["value"] <= meters
 
 
-def lat_long_snapped_path(path):
+def lat_long_snapped_path(path, client=None):
     """
     Returns snapped path of highway from manually chosen points. (More accurate tracing)
 
     Parameters:
     * path (list) : list of coordinate points manually chosen along highway
+    * client (googlemaps.Client) : defaults to the module client gmap
 
     Returns:
         Tuple (out, lat, long):
@@ -107,7 +348,8 @@ def lat_long_snapped_path(path):
         * lat (list) : just the latitude elements of each point
         * long (list) : just the longitude elements of each point
     """
-    snapped_points = gmap.snap_to_roads(path)
+    client = gmap if client is None else client
+    snapped_points = client.snap_to_roads(path)
     out, lat, long = [], [], []
     for hw_point in snapped_points:
         out.append(
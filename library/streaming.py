@@ -0,0 +1,167 @@
+"""
+streaming.py
+Created by Camila Pierce
+Last Updated 10.17.2026
+
+Out-of-core clustering for hotel sets too large to hold in memory as one scaled R^4 array.
+Hotels are read in chunks (text files or columnar datasets). One pass computes the signed
+distance of every hotel, written to disk, together with StandardScaler statistics and a
+random sample for initialization. MiniBatchKMeans is then fit with partial_fit on scaled,
+beta modified chunks, and a last pass writes every hotel's label to disk.
+"""
+import os
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans, kmeans_plusplus
+from sklearn.metrics import pairwise_distances_argmin_min
+from sklearn.preprocessing import StandardScaler
+from library import columnar, cubic_spline
+from library.sweep_kmeans import KMeansFit
+from library.visualize_clusters import modify_data
+
+
+def hotel_chunks(hotels_path, chunk_rows=100_000):
+    """
+    Yields (m, 3) lng, lat, rating blocks of a hotel text file or columnar dataset.
+    """
+    if os.path.isdir(hotels_path):
+        hotels = columnar.load_hotels(hotels_path)
+        for start in range(0, len(hotels["lng"]), chunk_rows):
+            rows = slice(start, start + chunk_rows)
+            yield np.column_stack((hotels["lng"][rows], hotels["lat"][rows], hotels["rating"][rows]))
+    else:
+        for block in cubic_spline.iter_hotels(hotels_path, chunk_rows):
+            yield np.column_stack((block["lng"], block["lat"], block["rating"]))
+
+
+def count_hotels(hotels_path):
+    """
+    Number of hotels in a text file (non-blank rows after the header, as iter_hotels reads
+    them, with or without a trailing newline) or columnar dataset.
+    """
+    if os.path.isdir(hotels_path):
+        return len(columnar.load_hotels(hotels_path)["lng"])
+    with open(hotels_path, "rb") as file:
+        file.readline()
+        return sum(1 for line in file if not line.isspace())
+
+
+class StreamingDataset:
+    """
+    Hotels on disk with their signed distance to the highway, streamed as scaled R^4 chunks.
+
+    Construction makes the one pass over the hotels: signed distances go to
+    directory/signed_distance.npy, StandardScaler statistics are accumulated with
+    partial_fit and a uniform random sample of rows is kept.
+
+    Parameters:
+    * hotels_path (str) : hotel text file or columnar dataset
+    * highway_spline (CubicSpline) : unscaled highway, as for cubic_spline.reformat_data
+    * directory (str) : folder for signed distances and labels, created if missing
+    * chunk_rows (int) : hotels read at a time
+    * sample_size (int) : rows kept for initializing clusters
+    * random_state (int) : seed of the sample
+    """
+
+    def __init__(self, hotels_path, highway_spline, directory, chunk_rows=100_000, sample_size=10_000,
+                 random_state=0):
+        self.hotels_path = hotels_path
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        os.makedirs(directory, exist_ok=True)
+
+        self.n = count_hotels(hotels_path)
+        self.signed_distance = np.lib.format.open_memmap(
+            os.path.join(directory, "signed_distance.npy"), mode="w+", dtype=np.float64, shape=(self.n,)
+        )
+        self.scaler = StandardScaler()
+        rng = np.random.default_rng(random_state)
+        sample, sample_keys = np.empty((0, 4)), np.empty(0)
+        start = 0
+        for chunk in hotel_chunks(hotels_path, chunk_rows):
+            if start + len(chunk) > self.n:
+                raise ValueError(f"{hotels_path} has more readable hotels than the {self.n} counted")
+            vectors = cubic_spline.reformat_data(chunk, highway_spline, engine="closed_form")
+            self.signed_distance[start:start + len(chunk)] = vectors[:, 3]
+            start += len(chunk)
+            self.scaler.partial_fit(vectors)
+            # keeps the sample_size rows with the smallest random keys seen so far
+            sample = np.vstack((sample, vectors))
+            sample_keys = np.concatenate((sample_keys, rng.random(len(vectors))))
+            if len(sample) > sample_size:
+                kept = np.argpartition(sample_keys, sample_size)[:sample_size]
+                sample, sample_keys = sample[kept], sample_keys[kept]
+        if start != self.n:
+            raise ValueError(f"{hotels_path} has {start} readable hotels, expected {self.n}")
+        self.signed_distance.flush()
+        self.sample = sample
+
+    def __len__(self):
+        return self.n
+
+    def chunks(self, method=None, beta=1):
+        """
+        Yields scaled R^4 chunks in file order, modified as visualize_clusters.modify_data
+        when method is given.
+        """
+        start = 0
+        for chunk in hotel_chunks(self.hotels_path, self.chunk_rows):
+            vectors = np.column_stack((chunk, self.signed_distance[start:start + len(chunk)]))
+            start += len(chunk)
+            yield self._transform(vectors, method, beta)
+
+    def scaled_sample(self, method=None, beta=1):
+        return self._transform(self.sample, method, beta)
+
+    def _transform(self, vectors, method, beta):
+        scaled = self.scaler.transform(vectors)
+        return scaled if method is None else modify_data(scaled, beta, method)
+
+
+def stream_kmeans(dataset, k=4, method=None, beta=1, batch_size=4096, epochs=1, random_state=0,
+                  labels_name=None):
+    """
+    MiniBatchKMeans over a StreamingDataset without loading it whole.
+
+    Centers start from k-means++ on the dataset's sample, then every chunk is shuffled and
+    fed to partial_fit in batches of batch_size, epochs times. A final pass assigns every
+    hotel to its closest center and writes the labels to dataset.directory.
+
+    Parameters:
+    * dataset (StreamingDataset) : hotels to cluster
+    * k (int) : number of clusters
+    * method (str) : beta method, see visualize_clusters.modify_data, None for no modification
+    * beta (float) : beta value
+    * batch_size (int) : rows per partial_fit call
+    * epochs (int) : passes of partial_fit over the data
+    * random_state (int) : seed of initialization and shuffling
+    * labels_name (str) : labels file name, defaults to labels_[method]_[beta].npy
+
+    Returns:
+        KMeansFit with labels memory-mapped from the labels file, n_iter_ counts
+        partial_fit calls
+    """
+    rng = np.random.default_rng(random_state)
+    init = kmeans_plusplus(dataset.scaled_sample(method, beta), k, random_state=random_state)[0]
+    kmeans = MiniBatchKMeans(n_clusters=k, init=init, n_init=1, batch_size=batch_size,
+                             random_state=random_state)
+    steps = 0
+    for _ in range(epochs):
+        for chunk in dataset.chunks(method, beta):
+            chunk = chunk[rng.permutation(len(chunk))]
+            for start in range(0, len(chunk), batch_size):
+                kmeans.partial_fit(chunk[start:start + batch_size])
+                steps += 1
+
+    if labels_name is None:
+        labels_name = "labels.npy" if method is None else f"labels_{method}_{beta}.npy"
+    path = os.path.join(dataset.directory, labels_name)
+    labels = np.lib.format.open_memmap(path, mode="w+", dtype=np.int32, shape=(len(dataset),))
+    inertia, start = 0.0, 0
+    for chunk in dataset.chunks(method, beta):
+        chunk_labels, distances = pairwise_distances_argmin_min(chunk, kmeans.cluster_centers_)
+        labels[start:start + len(chunk)] = chunk_labels
+        inertia += float((distances ** 2).sum())
+        start += len(chunk)
+    labels.flush()
+    del labels
+    return KMeansFit(np.load(path, mmap_mode="r"), kmeans.cluster_centers_, inertia, steps)
@@ -0,0 +1,172 @@
+"""
+sweep_kmeans.py
+Created by Camila Pierce
+Last Updated 10.17.2026
+
+K-means for beta sweeps, where only the fourth column (signed distance) changes between
+runs. Lloyd iterations for many betas run in lockstep as batched array operations: the
+fixed columns 0-2 enter each assignment through one matrix product with the centers of
+every beta at once, and only the reweighted fourth column is beta specific.
+"""
+import numpy as np
+from sklearn.cluster import kmeans_plusplus
+
+
+class KMeansFit:
+    """
+    Result of one beta, with the KMeans attributes used by visualize_clusters.
+    """
+
+    __slots__ = ("n_clusters", "labels_", "cluster_centers_", "inertia_", "n_iter_")
+
+    def __init__(self, labels, centers, inertia, n_iter):
+        self.n_clusters = len(centers)
+        self.labels_ = labels
+        self.cluster_centers_ = centers
+        self.inertia_ = inertia
+        self.n_iter_ = n_iter
+
+
+class SweepKMeans:
+    """
+    Lloyd k-means over many versions of the same data that differ only in one column.
+
+    Parameters:
+    * n_clusters (int) : number of clusters
+    * max_iter (int) : Lloyd iterations per beta
+    * tol (float) : relative tolerance on center movement, as in sklearn KMeans
+    * random_state (int) : seed of the k-means++ initialization of each beta
+    * batch_size (int) : betas iterated together
+    * chunk_elements (int) : point-center-beta distances held at once, keeps the
+        working set in cache
+
+    After fit, results_ holds one KMeansFit per beta, also available by indexing.
+    """
+
+    def __init__(self, n_clusters=4, max_iter=300, tol=1e-4, random_state=None, batch_size=16,
+                 chunk_elements=1 << 16):
+        self.n_clusters = n_clusters
+        self.max_iter = max_iter
+        self.tol = tol
+        self.random_state = random_state
+        self.batch_size = batch_size
+        self.chunk_elements = chunk_elements
+
+    def fit(self, fixed, columns=None, init=None):
+        """
+        Parameters:
+        * fixed (numpy array or BetaSweep) : (n, d) columns shared by every beta, or a
+            visualize_clusters.BetaSweep holding fixed and columns
+        * columns (numpy array) : (n_betas, n) reweighted column of each beta
+        * init (numpy array) : optional (n_betas, n_clusters, d + 1) starting centers,
+            k-means++ on each beta's data otherwise
+
+        Returns:
+            self
+        """
+        if columns is None:
+            fixed, columns = fixed.fixed, fixed.columns
+        fixed = np.asarray(fixed, dtype=float)
+        columns = np.atleast_2d(np.asarray(columns, dtype=float))
+        self.results_ = []
+        for start in range(0, len(columns), self.batch_size):
+            batch = slice(start, start + self.batch_size)
+            self.results_.extend(
+                self._fit_batch(fixed, columns[batch], None if init is None else init[batch])
+            )
+        return self
+
+    def __len__(self):
+        return len(self.results_)
+
+    def __getitem__(self, index):
+        return self.results_[index]
+
+    def _fit_batch(self, fixed, columns, init):
+        n_betas, n = columns.shape
+        k = self.n_clusters
+        if init is None:
+            random_state = np.random.RandomState(self.random_state)
+            init = np.array([
+                kmeans_plusplus(np.column_stack((fixed, column)), k, random_state=random_state)[0]
+                for column in columns
+            ])
+        centers = np.array(init, dtype=float)
+
+        # sklearn scales tol by the mean feature variance of each beta's data
+        variance = fixed.var(axis=0).sum() + columns.var(axis=1)
+        tolerance = self.tol * variance / (fixed.shape[1] + 1)
+        active = np.arange(n_betas)
+        labels = np.zeros((n_betas, n), dtype=np.int32)
+        n_iter = np.zeros(n_betas, dtype=int)
+
+        for _ in range(self.max_iter):
+            labels[active], updated = self._lloyd_step(fixed, columns[active], centers[active])
+            n_iter[active] += 1
+            shift = ((updated - centers[active]) ** 2).sum(axis=(1, 2))
+            centers[active] = updated
+            active = active[shift > tolerance[active]]
+            if len(active) == 0:
+                break
+
+        # final labels and exact inertia for the converged centers
+        labels = self._lloyd_step(fixed, columns, centers)[0]
+        rows = np.arange(n_betas)[:, np.newaxis]
+        assigned = centers[rows, labels]
+        inertia = ((fixed - assigned[:, :, :-1]) ** 2).sum(axis=(1, 2))
+        inertia += ((columns - assigned[:, :, -1]) ** 2).sum(axis=1)
+        return [
+            KMeansFit(labels[b], centers[b], float(inertia[b]), int(n_iter[b])) for b in range(n_betas)
+        ]
+
+    def _lloyd_step(self, fixed, columns, centers):
+        """
+        Assigns every point to its closest center for every beta and returns
+        (labels (n_betas, n), updated centers). Points go through in cache sized chunks.
+        """
+        n_betas, k, n_features = centers.shape
+        # |x - c|^2 = |x|^2 - 2 x.c + |c|^2, |x|^2 is the same for every center so only
+        # x.c - |c|^2 / 2 is compared. The fixed columns (and a column of ones for the
+        # center norms) of every center of every beta go through one matrix product, laid
+        # out (n, k, n_betas) so each center is contiguous
+        half_norms = 0.5 * np.einsum("bkd,bkd->kb", centers, centers)
+        center_fixed = np.vstack((
+            centers[:, :, :-1].transpose(2, 1, 0).reshape(-1, k * n_betas),
+            -half_norms.reshape(1, -1),
+        ))
+        center_column = centers[:, :, -1].T
+
+        labels = np.empty((n_betas, len(fixed)), dtype=np.int32)
+        counts = np.zeros(k * n_betas)
+        sums = np.zeros((n_features, k * n_betas))
+        beta_index = np.arange(n_betas)
+        rows = max(1, self.chunk_elements // (k * n_betas))
+        for start in range(0, len(fixed), rows):
+            chunk = slice(start, start + rows)
+            fixed_chunk, column_chunk = fixed[chunk], columns[:, chunk].T
+            scores = (np.column_stack((fixed_chunk, np.ones(len(fixed_chunk)))) @ center_fixed)
+            scores = scores.reshape(len(fixed_chunk), k, n_betas)
+
+            best = scores[:, 0] + column_chunk * center_column[0]
+            chunk_labels = np.zeros(best.shape, dtype=np.int32)
+            for cluster in range(1, k):
+                score = scores[:, cluster]
+                score += column_chunk * center_column[cluster]
+                better = score > best
+                np.maximum(best, score, out=best)
+                np.copyto(chunk_labels, cluster, where=better)
+            labels[:, chunk] = chunk_labels.T
+
+            # cluster sums of every beta, cluster major as center_fixed
+            flat = (chunk_labels * n_betas + beta_index).ravel()
+            counts += np.bincount(flat, minlength=k * n_betas)
+            for feature in range(n_features - 1):
+                weights = np.repeat(fixed_chunk[:, feature], n_betas)
+                sums[feature] += np.bincount(flat, weights=weights, minlength=k * n_betas)
+            sums[-1] += np.bincount(flat, weights=column_chunk.ravel(), minlength=k * n_betas)
+
+        counts = counts.reshape(k, n_betas).T
+        sums = sums.reshape(n_features, k, n_betas).transpose(2, 1, 0)
+        # empty clusters keep their center
+        updated = np.where(counts[:, :, np.newaxis] > 0, sums / np.maximum(counts, 1)[:, :, np.newaxis], centers)
+        return labels, updated
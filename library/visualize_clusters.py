@@ -10,12 +10,18 @@ may be other attributes.
 Reformatted using black.
 """
 
+import os
+from concurrent.futures import ProcessPoolExecutor
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import numpy as np
 from scipy.spatial import ConvexHull
 from shapely import intersection, Polygon, get_coordinates
 from sklearn.cluster import KMeans, kmeans_plusplus
-from sklearn.metrics import adjusted_rand_score
+from library.cluster_metrics import ari_to_reference, pairwise_ari
+from library.clustering_result import ClusteringResult, hull_overlaps
+from library.sweep_kmeans import KMeansFit
 
 
 # color map for visualization
@@ -41,7 +47,8 @@ def visualize_clusters(
     title="Untitled",
     plot_matrix = False,
     sub_axes = None,
-    subplot_ix = (0, 0)
+    subplot_ix = (0, 0),
+    return_result = False,
 ):
     """
     Plots data vectors into assigned clusters from running scipy kmeans.
@@ -51,90 +58,37 @@ def visualize_clusters(
     * data_vectors (numpy array) :
     * kmeans_object (scipy KMeans) :
     * num_clusters (int) :
+    * return_result (bool) : return the ClusteringResult instead of its dictionary
 
     Returns:
-        Dictionary of cluster info {num : (int), inertia : (float),
+        Dictionary of cluster info (ClusteringResult.to_dict) {num : (int), inertia : (float),
+        overlap : (float) total pairwise overlap area of the convex hulls,
         clusters: {label : (int),
             cluster_center : (numpy array), area : (float),
             convex_hull : (ConvexHull), members : (numpy_array)}
     """
 
-    # Dictionary containing master information about clustering
-    cluster_info = {
-        "num": num_clusters,
-        "inertia": kmeans_object.inertia_,
-        "clusters": [
-            ### Will contain a dictionary for each cluster with keys:
-            # "label" - label assigned by kmeans
-            # "cluster_center" - average of all cluster members - all dimensions
-            # "area" - area of convex hull
-            # "convex_hull" - ConvexHull object
-            # "members" - array, data_vectors of each cluster
-        ],
-    }
+    # Groups members by cluster, builds hulls and their total overlap once
+    # *Clusters of less than three data points cannot create a viable convex hull
+    result = ClusteringResult.from_fit(data_vectors, kmeans_object, num_clusters)
 
     # Find locations of created clusters
-    center_locations = kmeans_object.cluster_centers_
-
-    # Prep cluster_members
-    # Each entry in dictionary collects the indexes of data points belonging to that cluster
-    cluster_members = {i: [] for i in range(num_clusters)}
-    cluster_info["clusters"].extend(
-        [
-            {"label": i, "cluster_center": kmeans_object.cluster_centers_[i]}
-            for i in range(num_clusters)
-        ]
-    )
-    # Sorts indexes of data by cluster
-    for index, label in enumerate(kmeans_object.labels_):
-        cluster_members[label].append(index)
-
-    convex_hull_borders = []
+    center_locations = result.centers
 
     if plot_matrix is False: fig = plt.figure()
+    ax = plt.gca() if not plot_matrix else sub_axes[subplot_ix[0], subplot_ix[1]]
     ### Geographic space
-    for cluster in cluster_members:
-        # Collects x and y of data points in each cluster to scatter plot correctly
-        # starts building convex hull
-        temp_x, temp_y, ch_format, full_member = [], [], [], []
-        for member in cluster_members[cluster]:
-            temp_x.append(data_vectors[member, 0])
-            temp_y.append(data_vectors[member, 1])
-            ch_format.append(
-                np.array([data_vectors[member, 0], data_vectors[member, 1]])
-            )
-            full_member.append(data_vectors[member])
-        if not plot_matrix: plt.scatter(temp_x, temp_y, c=COLORS[cluster])
-        else: sub_axes[subplot_ix[0], subplot_ix[1]].scatter(temp_x, temp_y, c=COLORS[cluster])
-        # Creates convex hull for each cluster, saves vertices of each hull to convex_hull_borders
-        # *Clusters of less than three data points cannot create a viable convex hull,
-        # would throw error in ConvexHull module
-        ch_format = np.array(ch_format)
-        if len(ch_format) > 2:
-            hull = ConvexHull(ch_format)
-            cluster_info["clusters"][cluster]["convex_hull"] = hull
-            cluster_info["clusters"][cluster]["area"] = hull.area
-            # plots convex hull lines for this cluster
-            if not plot_matrix:
-                for simplex in hull.simplices:
-                    plt.plot(
-                        ch_format[simplex, 0], ch_format[simplex, 1], c=COLORS[cluster]
-                    )
-                plt.scatter(center_locations[:, 0], center_locations[:, 1], c="red")
-            else:
-                for simplex in hull.simplices:
-                    sub_axes[subplot_ix[0], subplot_ix[1]].plot(
-                        ch_format[simplex, 0], ch_format[simplex, 1], c=COLORS[cluster]
-                    )
-                sub_axes[subplot_ix[0], subplot_ix[1]].scatter(center_locations[:, 0],
-                                                             center_locations[:, 1], c="red")
-
-            convex_hull_borders.append([ch_format[index] for index in hull.vertices])
-        else:
-            cluster_info["clusters"][cluster]["area"] = 0
-        cluster_info["clusters"][cluster]["members"] = np.asarray(full_member)
-        cluster_info["clusters"][cluster]
-        all_intersection_combos(convex_hull_borders)
+    for cluster in range(num_clusters):
+        members = result.members(cluster)
+        ax.scatter(members[:, 0], members[:, 1], c=COLORS[cluster])
+        hull = result.hull(cluster)
+        if len(hull):
+            # plots convex hull lines for this cluster, 2d vertices are in counterclockwise
+            # order so the closed ring is one line
+            ring = np.append(hull, hull[0])
+            ax.plot(data_vectors[ring, 0], data_vectors[ring, 1], c=COLORS[cluster])
+    if len(result.hull_vertices):
+        ax.scatter(center_locations[:, 0], center_locations[:, 1], c="red")
 
     # Plot after removing next five lines ***
     # xlimit = plt.xlim()
@@ -155,7 +109,7 @@ def visualize_clusters(
         # plt.colorbar(label="hotel rating")
 
     if not plot_matrix: plt.title(label=title)
-    return cluster_info
+    return result if return_result else result.to_dict()
 
 
 ### Computing areas
@@ -195,6 +149,8 @@ def all_intersection_combos(list_of_convex_borders, factor=1, plot=False):
     Returns:
         Total overlap area of convex hulls multiplied by optional scaling factor
     """
+    if not plot:
+        return hull_overlaps(list_of_convex_borders, factor)[1]
     total_overlap_area = 0
     # print("Intersection Areas:")
     for index_1, cluster_1 in enumerate(list_of_convex_borders):
@@ -317,40 +273,88 @@ def modify_data(data, b, mthd):
     Returns:
         Modified data, numpy array
     """
+    return np.column_stack((data[:, :3], beta_columns(data[:, 3], [b], mthd)[0]))
+
+
+def beta_columns(signed_distance, betas, mthd):
+    """
+    Signed distance column after each beta modification, see modify_data for methods.
+
+    Parameters:
+    * signed_distance (numpy array) : fourth column of R^4 data
+    * betas (list of floats) : beta values
+    * mthd (str) : scaling, adding or bool_value
+
+    Returns:
+        numpy array (n_betas, n), one modified column per beta
+    """
+    distance = np.asarray(signed_distance, dtype=float)
+    beta = np.asarray(betas, dtype=float)[:, np.newaxis]
     if mthd == "scaling":
-        return np.array(
-            [
-                np.array((data[i, 0], data[i, 1], data[i, 2], data[i, 3] * b))
-                for i in range(len(data))
-            ]
-        )
+        return distance * beta
     elif mthd == "adding":
-        return np.array(
-            [
-                np.array(
-                    (
-                        data[i, 0],
-                        data[i, 1],
-                        data[i, 2],
-                        (data[i, 3] + b if data[i, 3] > 0 else data[i, 3] - b),
-                    )
-                )
-                for i in range(len(data))
-            ]
-        )
+        return np.where(distance > 0, distance + beta, distance - beta)
     elif mthd == "bool_value":
-        return np.array(
-            [
-                np.array(
-                    (data[i, 0], data[i, 1], data[i, 2], (0 if data[i, 3] < 0 else b))
-                )
-                for i in range(len(data))
-            ]
-        )
+        return np.where(distance < 0, 0.0, beta)
     else:
         raise ValueError
 
 
+class BetaSweep:
+    """
+    Lazy stack of modify_data results over many betas. Columns 0-2 are kept once in fixed,
+    only the modified fourth column is stored per beta in columns.
+
+    Indexing with i builds the full (n, 4) array for betas[i].
+    """
+
+    def __init__(self, data, betas, mthd):
+        self.betas = np.asarray(betas, dtype=float)
+        self.method = mthd
+        self.fixed = np.ascontiguousarray(data[:, :3], dtype=float)
+        self.columns = beta_columns(data[:, 3], self.betas, mthd)
+
+    def __len__(self):
+        return len(self.betas)
+
+    def __getitem__(self, index):
+        return np.column_stack((self.fixed, self.columns[index]))
+
+
+def modify_data_batch(data, betas, mthd, lazy=False):
+    """
+    modify_data for a vector of betas at once. Assumes data is R^4.
+
+    Parameters:
+    * data (numpy array) : array of data values to modify
+    * betas (list of floats) : beta values
+    * mthd (str) : scaling, adding or bool_value, see modify_data
+    * lazy (bool) : if true, returns a BetaSweep sharing columns 0-2 instead of a full copy
+
+    Returns:
+        numpy array (n_betas, n, 4), or BetaSweep if lazy
+    """
+    sweep = BetaSweep(data, betas, mthd)
+    if lazy:
+        return sweep
+    stacked = np.empty((len(sweep), len(sweep.fixed), 4))
+    stacked[:, :, :3] = sweep.fixed
+    stacked[:, :, 3] = sweep.columns
+    return stacked
+
+
+def beta_range(start=0.1, stop=5, increment=0.05):
+    """
+    Beta values from start to stop (inclusive) as increment_beta_values steps through them.
+    """
+    beta = start
+    all_betas = []
+    while beta <= stop:
+        all_betas.append(beta)
+        beta += increment
+    return all_betas
+
+
 def increment_beta_values(
     data_vectors,
     highway_cubic_spline,
@@ -365,13 +369,17 @@ def increment_beta_values(
     stop=5,
     increment=0.05,
     overlay_rating=False,
+    beta_scores=None,
+    plot=True,
+    directory="results",
+    cache=None,
 ):
     """
     Runs k-means of every beta modification from start to stop.
     Plots sklearn.adjusted_rand_score of clusters
     based on expected left/right distributions.
 
-    User inputs beta values to be inspected, reruns clustering with given values.
+    Reruns clustering with the beta values of final_beta_list.
 
     Parameters:
     * data_vectors (numpy array) : hotel data vectors
@@ -383,72 +391,127 @@ def increment_beta_values(
     * start (float) : starting beta value
     * stop (float) : ending beta value
     * increment (float) : increment value between trials
+    * beta_scores (tuple) : (betas, scores) already computed for this method, for example
+        by beta_sweep.method_scores, skips the sweep
+    * plot (bool) : if false, only computes, see render_result
+    * directory (str) : folder plots are saved to
+    * cache (KMeansCache) : if given, fits are loaded from it when already run
+
+    Returns:
+        Result dictionary of beta_increment_result
     """
+    result = beta_increment_result(
+        data_vectors, highway_cubic_spline, name, k, n, method=method,
+        final_beta_list=final_beta_list, start=start, stop=stop, increment=increment,
+        overlay_rating=overlay_rating, beta_scores=beta_scores, cache=cache,
+    )
+    if plot:
+        render_result(result, directory)
+    return result
 
-    ### incrementing through beta values
-    beta = start
-    all_betas = []
-    beta_yields = []
-    left_right_labels = [
-        (0 if data_vectors[i, 3] > 0 else 1) for i in range(len(data_vectors))
-    ]
 
-    # print("Beta\t Inertia\t Overlap Area\t Combined")
-    while beta <= stop:
-        ###modify initial data with beta value
-        modified_data = modify_data(data_vectors, beta, mthd=method)
-        ###run kmeans on modified data
-        kmeans = KMeans(n_clusters=4, init="k-means++")
-        estimator = kmeans.fit(modified_data)
-        ###gather beta value with score
-        all_betas.append(beta)
-        beta_yields.append(adjusted_rand_score(left_right_labels, kmeans.labels_))
-        beta += increment
+def temp_variability_demo(
+    data_vectors,
+    highway_cubic_spline,
+    k=4,
+    final_beta_list = ((1, 1),
+                       (1, 1),
+                       (1, 1)),
+    title="untitled",
+    special_init = "k-means++",
+    supertitle = f"Repeated Control, R^3 Data, Vanilla K-Means++",
+    plot=True,
+    directory="results",
+    cache=None,
+):
+    """
+    Repeats the same clustering once per entry of final_beta_list to show run to run
+    variability. See variability_result, plots unless plot is false. Fits are loaded from
+    cache (KMeansCache) when given.
+    """
+    result = variability_result(
+        data_vectors, highway_cubic_spline, k=k, final_beta_list=final_beta_list,
+        title=title, special_init=special_init, supertitle=supertitle, cache=cache,
+    )
+    if plot:
+        render_result(result, directory)
+    return result
+
 
-    #### plot data evaluation with beta values
-    plt.figure()
-    plt.plot(all_betas, beta_yields, "o-r")
-    plt.title(f"{name} adjusted_rand_score for {method}")
-    plt.savefig(f"results/{method}_beta_increment_scores_{name}")
-    plt.show(block=False)
+### Computing clusterings to plot
 
-    # collect floats for which to rerun clustering
-    # final_beta_list = [
-    #     float(beta)
-    #     for beta in (
-    #         input("Optimal Beta value (floats separated by a space or single float): ")
-    #     ).split()
-    # ]
 
+def beta_increment_result(
+    data_vectors,
+    highway_cubic_spline,
+    name,
+    k,
+    n,
+    method="scaling",
+    final_beta_list = ((.5, 1),
+                       (1.5, 2),
+                       (3, 5)),
+    start=0.1,
+    stop=5,
+    increment=0.05,
+    overlay_rating=False,
+    beta_scores=None,
+    cache=None,
+):
+    """
+    Computing half of increment_beta_values, nothing is drawn.
 
-    fig, axes = plt.subplots(3, 2, layout="constrained")
+    Returns:
+        Dictionary {kind : "beta_increment", name, method, k, n, overlay_rating,
+        betas : (numpy array), scores : (numpy array) adjusted_rand_score of each beta,
+        data : (numpy array) data_vectors, highway : (hw_x, hw_y) sampled spline,
+        grid : rows of {beta : (float), fit : (KMeansFit)}}
+    """
 
+    ### incrementing through beta values
+    if beta_scores is not None:
+        all_betas, beta_yields = beta_scores
+    else:
+        all_betas = beta_range(start, stop, increment)
+        left_right_labels = np.where(data_vectors[:, 3] > 0, 0, 1)
+        ###modify initial data with every beta value, columns 0-2 shared
+        sweep = modify_data_batch(data_vectors, all_betas, method, lazy=True)
 
-    for r, row in enumerate(final_beta_list):
-        for c, final_beta in enumerate(row):
-            modified_data = modify_data(data_vectors, final_beta, method)
-            ###run kmeans on modified data
-            kmeans = KMeans(n_clusters=k, init="k-means++")
-            estimator = kmeans.fit(modified_data)
+        ###run kmeans on modified data
+        labels = np.array([
+            fit_result(modified_data, 4, cache=cache, method=method, beta=beta).labels_
+            for beta, modified_data in zip(all_betas, sweep)
+        ])
+        ###score every beta at once
+        beta_yields = ari_to_reference(labels, left_right_labels)
+
+    grid = [
+        [
+            {
+                "beta": final_beta,
+                "fit": fit_result(modify_data(data_vectors, final_beta, method), k, cache=cache,
+                                  method=method, beta=final_beta),
+            }
+            for final_beta in row
+        ]
+        for row in final_beta_list
+    ]
+    return {
+        "kind": "beta_increment",
+        "name": name,
+        "method": method,
+        "k": k,
+        "n": n,
+        "overlay_rating": overlay_rating,
+        "betas": np.asarray(all_betas, dtype=float),
+        "scores": np.asarray(beta_yields, dtype=float),
+        "data": np.asarray(data_vectors),
+        "highway": sample_highway(highway_cubic_spline),
+        "grid": grid,
+    }
 
-            visualize_clusters(modified_data, kmeans, k, plot_rating=overlay_rating,
-                title=f"Beta {method} {final_beta} of {name} with {k} clusters within {n} miles",
-                plot_matrix=True, sub_axes=axes, subplot_ix=(r, c)
-            )
-            axes[r, c].set_title(f"Beta: {final_beta}")
-            # plot_cubic_spline_highway(highway_cubic_spline)
-            hw_x = np.linspace(highway_cubic_spline.x[0], highway_cubic_spline.x[-1], num=100)
-            plotting_fxn = highway_cubic_spline(hw_x)
-            axes[r, c].plot(hw_x, plotting_fxn)
-    if overlay_rating: plt.colorbar(label="hotel rating")
-    fig.suptitle(f"{name} clustering with {method} betas")
-    fig.set_size_inches(8, 6)
-    plt.savefig(
-                f"results/{name}_{method}_with.png"
-            )
-    plt.show(block=False)
 
-def temp_variability_demo(
+def variability_result(
     data_vectors,
     highway_cubic_spline,
     k=4,
@@ -457,34 +520,149 @@ def temp_variability_demo(
                        (1, 1)),
     title="untitled",
     special_init = "k-means++",
-    supertitle = f"Repeated Control, R^3 Data, Vanilla K-Means++"
+    supertitle = f"Repeated Control, R^3 Data, Vanilla K-Means++",
+    cache=None,
 ):
+    """
+    Computing half of temp_variability_demo: one clustering of the unmodified data per
+    entry of final_beta_list. Each entry is cached as a separate repeat.
 
-    fig, axes = plt.subplots(3, 2, layout="constrained")
-
-
-    for r, row in enumerate(final_beta_list):
-        for c, final_beta in enumerate(row):
+    Returns:
+        Dictionary {kind : "variability", title, supertitle, k, data, highway, grid,
+        pairwise_ari : (numpy array) adjusted_rand_score between every two runs, in grid
+        order}, see beta_increment_result
+    """
+    grid = [
+        [
             # Produces initialization for "vanilla" k-means++ clustering
             # special_init, indices = kmeans_plusplus(data_vectors, 4, n_local_trials=1)
+            {
+                "beta": final_beta,
+                "fit": fit_result(data_vectors, 4, init=special_init, cache=cache,
+                                  repeat=r * len(row) + c),
+            }
+            for c, final_beta in enumerate(row)
+        ]
+        for r, row in enumerate(final_beta_list)
+    ]
+    return {
+        "kind": "variability",
+        "title": title,
+        "supertitle": supertitle,
+        "k": k,
+        "data": np.asarray(data_vectors),
+        "highway": sample_highway(highway_cubic_spline),
+        "grid": grid,
+        "pairwise_ari": pairwise_ari([cell["fit"].labels_ for row in grid for cell in row]),
+    }
 
-            kmeans = KMeans(n_clusters=4, init=special_init)
-            estimator = kmeans.fit(data_vectors)
 
-            visualize_clusters(data_vectors, kmeans, k, plot_rating=False,
-                plot_matrix=True, sub_axes=axes, subplot_ix=(r, c)
-            )
-            axes[r, c].set_title(f"Beta: {final_beta}")
-            # plot_cubic_spline_highway(highway_cubic_spline)
-            hw_x = np.linspace(highway_cubic_spline.x[0], highway_cubic_spline.x[-1], num=100)
-            plotting_fxn = highway_cubic_spline(hw_x)
-            axes[r, c].plot(hw_x, plotting_fxn)
-    fig.suptitle(supertitle)
+def fit_result(data, k, init="k-means++", cache=None, method=None, beta=None, repeat=0):
+    """
+    Runs sklearn KMeans and keeps only what plotting uses, as a picklable KMeansFit.
+    With a KMeansCache, the fit is looked up by data, k, init and method, beta, repeat
+    (which only label the cache entry).
+    """
+    if cache is not None:
+        return cache.fit(data, k, init, method=method, beta=beta, repeat=repeat)
+    kmeans = KMeans(n_clusters=k, init=init).fit(data)
+    return KMeansFit(kmeans.labels_, kmeans.cluster_centers_, kmeans.inertia_, kmeans.n_iter_)
+
+
+def sample_highway(spline_obj, num_samples=100):
+    """
+    Returns (hw_x, hw_y) points of the highway as plot_cubic_spline_highway draws it.
+    """
+    hw_x = np.linspace(spline_obj.x[0], spline_obj.x[-1], num=num_samples)
+    return hw_x, spline_obj(hw_x)
+
+
+### Rendering
+
+
+def render_result(result, directory="results"):
+    """
+    Draws and saves the plots of one beta_increment_result or variability_result.
+    Figures are drawn on the Agg canvas without pyplot, so no window or display is needed
+    and every figure is closed once saved.
+
+    Returns:
+        List of saved file paths
+    """
+    if result["kind"] == "beta_increment":
+        name, method = result["name"], result["method"]
+        saved = [
+            _save(_scores_figure(result), f"{directory}/{method}_beta_increment_scores_{name}.png"),
+            _save(_grid_figure(result, f"{name} clustering with {method} betas"),
+                  f"{directory}/{name}_{method}_with.png"),
+        ]
+    elif result["kind"] == "variability":
+        saved = [_save(_grid_figure(result, result["supertitle"]), f"{directory}/{result['title']}.png")]
+    else:
+        raise ValueError(f"cannot render {result['kind']}")
+    return saved
+
+
+def render_results(results, directory="results", workers=1):
+    """
+    Renders many results, in a pool of worker processes when workers is not 1.
+
+    Parameters:
+    * results (list) : beta_increment_result or variability_result dictionaries
+    * directory (str) : folder plots are saved to
+    * workers (int) : processes drawing at once, None uses every core
+
+    Returns:
+        List of saved file paths, in the order of results
+    """
+    if workers == 1:
+        saved = [render_result(result, directory) for result in results]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            saved = list(executor.map(render_result, results, [directory] * len(results)))
+    return [path for paths in saved for path in paths]
+
+
+def _scores_figure(result):
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    ax.plot(result["betas"], result["scores"], "o-r")
+    ax.set_title(f"{result['name']} adjusted_rand_score for {result['method']}")
+    return fig
+
+
+def _grid_figure(result, suptitle):
+    grid = result["grid"]
+    fig = Figure(layout="constrained")
+    FigureCanvasAgg(fig)
+    axes = fig.subplots(len(grid), len(grid[0]), squeeze=False)
+    data, k = result["data"], result["k"]
+    hw_x, hw_y = result["highway"]
+    rating = None
+    for r, row in enumerate(grid):
+        for c, cell in enumerate(row):
+            visualize_clusters(data, cell["fit"], k, plot_matrix=True, sub_axes=axes, subplot_ix=(r, c),
+                               return_result=True)
+            if result.get("overlay_rating"):
+                rating = axes[r, c].scatter(data[:, 0], data[:, 1], cmap="viridis", c=data[:, 2])
+            axes[r, c].set_title(f"Beta: {cell['beta']}")
+            axes[r, c].plot(hw_x, hw_y)
+    if rating is not None:
+        fig.colorbar(rating, ax=axes, label="hotel rating")
+    fig.suptitle(suptitle)
     fig.set_size_inches(8, 6)
-    plt.savefig(
-                f"results/{title}.png"
-            )
-    plt.show(block=True)
+    return fig
+
+
+def _save(fig, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    try:
+        fig.savefig(path)
+    finally:
+        fig.clear()
+        plt.close(fig)
+    return path
 
 
 #################################################################
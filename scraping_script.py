@@ -2,8 +2,11 @@
 Run to scrape data from Google Maps.
 """
 #!/usr/bin/env python3
+import itertools
 import sys
+import numpy as np
 from library import scrape_google_maps
+from library.maps_cache import CachingClient
 
 def read_data(f_name):
     """ Reads txt file that contains highway data.
@@ -12,26 +15,49 @@ def read_data(f_name):
 
     Highway longitude must be in increasing order.
     """
-    file = open(f_name, "r")
-    file.readline()
-    data = []
-    for line in file.readlines():
-        data.append(tuple(float(d) for d in line.split()))
-    return data
+    return [tuple(point) for point in read_data_array(f_name).tolist()]
 
-def scrape_and_save_to_files(data, data_name, verbose=True):
+def read_data_array(f_name):
+    """
+    Same as read_data, parsed in one pass into a (n, 2) float64 array of
+    Latitude, Longitude. The first line is skipped, as in read_data.
+    """
+    with open(f_name, "r") as file:
+        file.readline()
+        return _parse_points(file.read())
+
+def iter_data_chunks(f_name, chunk_rows=100_000):
+    """
+    Yields (chunk_rows, 2) float64 arrays of Latitude, Longitude from a highway
+    file without reading the whole file. The first line is skipped, as in read_data.
+    """
+    with open(f_name, "r") as file:
+        file.readline()
+        while True:
+            block = "".join(itertools.islice(file, chunk_rows))
+            if not block:
+                return
+            yield _parse_points(block)
+
+def _parse_points(text):
+    return np.array(text.split(), dtype=np.float64).reshape(-1, 2)
+
+def scrape_and_save_to_files(data, data_name, verbose=True, workers=1, follow_pages=False, client=None):
     """
     Scrapes Google Maps and saves hotel data to a single file, and snapped
-    path data to another.
+    path data to another. workers highway points are searched at once, see
+    scrape_google_maps.collect_hotels_along_highway for follow_pages and client.
     """
     hotel_file_name = f"hotel_data/{data_name}_hotels.txt"
     snapped_file_name = f"snapped_highways/{data_name}_path.txt"
 
     if verbose: print("Finding snapped path...")
-    true_path, highway_lats, highway_lonngs = scrape_google_maps.lat_long_snapped_path(data)
+    true_path, highway_lats, highway_lonngs = scrape_google_maps.lat_long_snapped_path(data, client=client)
     if verbose: print("Scraping hotel data...")
     scrape_google_maps.collect_hotels_along_highway(true_path, return_value=False,
-                                                    filename=hotel_file_name)
+                                                    filename=hotel_file_name, workers=workers,
+                                                    follow_pages=follow_pages, client=client,
+                                                    verbose=verbose)
     save_matrix_to_file(true_path, snapped_file_name)
     if verbose:
         print("Complete!")
@@ -52,11 +78,22 @@ if __name__ == "__main__":
     import os
     # sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
 
-    if len(sys.argv) >= 3:
-        file_path = sys.argv[1]
+    # responses are kept in cache/google_maps.sqlite, --offline only reads them back and
+    # --no-cache always asks Google
+    offline = "--offline" in sys.argv
+    use_cache = "--no-cache" not in sys.argv
+    arguments = [argument for argument in sys.argv if argument not in ("--offline", "--no-cache")]
+
+    if len(arguments) >= 3:
+        file_path = arguments[1]
         highway_data = read_data(file_path)
-        file_name = sys.argv[2]# file_path.split("\\")[-1].split(".")[0]
-        scrape_and_save_to_files(highway_data, file_name)
+        file_name = arguments[2]# file_path.split("\\")[-1].split(".")[0]
+        # optional third argument: highway points searched at once
+        workers = int(arguments[3]) if len(arguments) >= 4 else 1
+        client = CachingClient(offline=offline) if use_cache or offline else None
+        scrape_and_save_to_files(highway_data, file_name, workers=workers, client=client)
+        if client is not None:
+            print(f"{client.hits} responses from cache, {client.misses} requested")
 
     else:
         print("Error: Too few arguments")
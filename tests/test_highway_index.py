@@ -0,0 +1,43 @@
+"""
+test_highway_index.py
+Created by Camila Pierce
+Last Updated 10.17.2026
+
+HighwayIndex must agree with the closed form batch_signed_distance.
+"""
+import numpy as np
+import pytest
+from scipy.interpolate import CubicSpline
+from library import cubic_spline
+
+
+def wiggly_spline(rng):
+    x = np.unique(rng.uniform(0, 20, rng.integers(5, 30)))
+    y = rng.normal(0, rng.uniform(0.2, 3), len(x))
+    return CubicSpline(x, y)
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_matches_closed_form_on_random_splines(seed):
+    rng = np.random.default_rng(seed)
+    spline = wiggly_spline(rng)
+    y = spline(spline.x)
+    points = np.column_stack((
+        rng.uniform(spline.x[0] - 1, spline.x[-1] + 1, 500),
+        rng.uniform(y.min() - 1, y.max() + 1, 500),
+    ))
+    expected = cubic_spline.batch_signed_distance(points, spline)[0]
+    found = cubic_spline.HighwayIndex(spline).query(points)[2]
+    np.testing.assert_allclose(found, expected, rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_matches_closed_form_on_curve(seed):
+    rng = np.random.default_rng(seed)
+    spline = wiggly_spline(rng)
+    x = rng.uniform(spline.x[0], spline.x[-1], 200)
+    points = np.column_stack((x, spline(x) + rng.normal(0, 1e-3, 200)))
+    expected = cubic_spline.batch_signed_distance(points, spline)[0]
+    found = cubic_spline.HighwayIndex(spline).query(points)[2]
+    np.testing.assert_allclose(found, expected, rtol=0, atol=1e-9)
+    assert np.all(np.abs(found) <= 1e-3 * 5)